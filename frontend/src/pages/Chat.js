@@ -76,6 +76,19 @@ function Chat() {
     console.log('Messages updated:', messages);
   }, [messages]);
 
+  const updateStreamingMessage = (streamId, update) => {
+    setMessages(prevMessages => {
+      // An error can arrive before any metadata created the bot message
+      if (!prevMessages.some(msg => msg.streamId === streamId)) {
+        const msg = { text: '', sender: 'bot', streamId, fileReferences: [], showMetrics: false };
+        return [...prevMessages, { ...msg, ...update(msg) }];
+      }
+      return prevMessages.map(msg =>
+        msg.streamId === streamId ? { ...msg, ...update(msg) } : msg
+      );
+    });
+  };
+
   const handleSend = async () => {
     if (input.trim() === '') return;
 
@@ -84,25 +97,57 @@ function Chat() {
     setInput('');
     setIsLoading(true);
 
+    // The answer is streamed as server-sent events: metadata first, then one
+    // event per generated token, then the full result
+    const streamId = Date.now();
+    const handleEvent = (event, data) => {
+      if (event === 'metadata') {
+        setIsLoading(false);
+        setMessages(prevMessages => [...prevMessages, {
+          text: '',
+          sender: 'bot',
+          streamId,
+          fileReferences: data.file_references || [],
+          metrics: data.retrieval_metrics,
+          showMetrics: false
+        }]);
+      } else if (event === 'token') {
+        updateStreamingMessage(streamId, msg => ({ text: msg.text + data.text }));
+      } else if (event === 'done' || event === 'error') {
+        updateStreamingMessage(streamId, () => ({
+          text: data.answer,
+          id: data.interaction_id,
+          fileReferences: data.file_references || [],
+          metrics: data.retrieval_metrics
+        }));
+      }
+    };
+
     try {
-      const response = await axios.post('http://localhost:8000/query', { question: input });
-      console.log('Full API response:', response.data);
-      const botMessage = {
-        text: response.data.answer,
-        sender: 'bot',
-        id: response.data.interaction_id,
-        fileReferences: response.data.file_references || [],
-        metrics: response.data.retrieval_metrics,
-        showMetrics: false
-      };
-      console.log('Bot message before state update:', botMessage);
-      setMessages(prevMessages => {
-        const newMessages = [...prevMessages, botMessage];
-        console.log('New messages state:', newMessages);
-        return newMessages;
+      const response = await fetch('http://localhost:8000/api/query/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text: input })
       });
+      if (!response.ok) throw new Error(`Request failed with status ${response.status}`);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const block of events) {
+          const event = block.match(/^event: (.*)$/m);
+          const data = block.match(/^data: (.*)$/m);
+          if (event && data) handleEvent(event[1], JSON.parse(data[1]));
+        }
+      }
     } catch (error) {
-      console.error('Error sending message:', error.response ? error.response.data : error);
+      console.error('Error sending message:', error);
       const errorMessage = { text: 'An error occurred while processing your request.', sender: 'bot' };
       setMessages(prevMessages => [...prevMessages, errorMessage]);
     } finally {
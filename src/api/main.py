@@ -2,18 +2,48 @@ import os
 import logging
 import asyncio
 from fastapi import Depends, FastAPI, Request, HTTPException, Query as FastAPIQuery
-from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    PlainTextResponse,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, validator, Field, ValidationError
-from src.pipeline.rag_pipeline import run_rag_pipeline, collect_user_feedback
+from src.pipeline.rag_pipeline import (
+    run_rag_pipeline_async,
+    stream_rag_pipeline,
+    replay_result,
+    error_result,
+    collect_user_feedback,
+)
 from src.ingestion.elasticsearch_ingestion import (
     retrieve_relevant_documents,
     get_elasticsearch_client,
+    get_index_version_async,
+    close_async_es,
 )
 from src.ingestion.query_rewriting import rewrite_and_expand_query
 from src.utils.service_locator import service_locator
+from src.models.embedding_cache import get_embedding_cache, query_cache
+from src.models.model_registry import model_stats
+from src.pipeline.answer_cache import answer_cache
+from src.pipeline.response_cache import (
+    response_cache,
+    canonical_query,
+    cache_response,
+)
+from src.utils.single_flight import SingleFlight
+from src.models.ollama_interface import (
+    close_async_client,
+    scheduler,
+    SchedulerBusy,
+    PRIORITIES,
+)
+from src.utils.config import RESPONSE_CACHE_ENABLED
+from src.utils.executor import run_blocking, executor_stats
 import time
 from src.utils.dashboard_metrics import (
     process_feedback_data,
@@ -58,6 +88,8 @@ templates = Jinja2Templates(directory="/app/src/templates")
 
 class Query(BaseModel):
     question: str
+    # Generation queue priority, "interactive" or "batch" (e.g. evaluation runs)
+    priority: str = "interactive"
 
 
 class FeedbackModel(BaseModel):
@@ -74,35 +106,227 @@ class FeedbackModel(BaseModel):
         return v
 
 
+@app.exception_handler(SchedulerBusy)
+async def scheduler_busy_handler(request: Request, exc: SchedulerBusy):
+    logger.warning(f"Rejected request, {exc} (retry after {exc.retry_after}s)")
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 
-@app.post("/query")
-async def query(query: Query, db: Session = Depends(database.get_db)):
-    start_time = time.time()
-    result = run_rag_pipeline(query.question)
-    end_time = time.time()
-    response_time = end_time - start_time
+async def cached_response(question):
+    # Identical questions (after abbreviation expansion and case/whitespace
+    # folding) are served from the response cache; anything else goes through
+    # the pipeline, which has its own semantic cache
+    index_version = await get_index_version_async() if RESPONSE_CACHE_ENABLED else None
+    if index_version is None:
+        return None, None
+    response, age, tier = await run_blocking(
+        response_cache.get, question, index_version
+    )
+    if response is None:
+        return None, index_version
+    logger.info(f"Response cache hit ({tier}, {age:.0f}s old): {question}")
+    cached = {
+        **response,
+        "question": question,
+        "cache": {"hit": True, "type": "exact", "tier": tier, "age": age},
+    }
+    return cached, index_version
 
-    # Store interaction in the database
+
+# Identical questions that arrive while one is being answered wait for that
+# answer instead of running their own retrieval and generation, whether they
+# came in through /query, /api/query or /api/query/stream
+question_flights = SingleFlight()
+
+
+async def compute_answer(question, index_version, priority):
+    result = await run_rag_pipeline_async(question, priority)
+    return await run_blocking(cache_response, question, result, index_version)
+
+
+def check_priority(priority):
+    if priority not in PRIORITIES:
+        raise HTTPException(
+            status_code=422, detail=f"priority must be one of {list(PRIORITIES)}"
+        )
+
+
+async def answer_query(question, priority="interactive"):
+    # Retrieval, generation and the database write are awaited or run on the
+    # bounded executor, so a slow answer does not hold up other requests
+    cached, index_version = await cached_response(question)
+    if cached is not None:
+        return cached
+    response, shared = await question_flights.run(
+        canonical_query(question),
+        lambda: compute_answer(question, index_version, priority),
+    )
+    if shared:
+        logger.info(f"Coalesced with an in-flight request: {question}")
+        response = coalesced_response(response, question)
+    return response
+
+
+def coalesced_response(response, question):
+    return {
+        **response,
+        "question": question,
+        "cache": {**response["cache"], "coalesced": True},
+    }
+
+
+def record_interaction(db, question, result, response_time):
     db_interaction = models.Interaction(
-        query=query.question,
+        query=question,
         response=result["answer"],
         response_time=response_time,
-        retrieval_metrics=json.dumps(result["retrieval_metrics"]),  # Add this line
+        retrieval_metrics=json.dumps(result["retrieval_metrics"]),
+        error=result.get("error"),
     )
     db.add(db_interaction)
     db.commit()
     db.refresh(db_interaction)
+    return db_interaction.id
+
+
+def record_interaction_in_new_session(question, result, response_time):
+    db = database.SessionLocal()
+    try:
+        return record_interaction(db, question, result, response_time)
+    finally:
+        db.close()
+
+
+@app.post("/query")
+async def query(query: Query, db: Session = Depends(database.get_db)):
+    start_time = time.time()
+    check_priority(query.priority)
+    result = await answer_query(query.question, query.priority)
+    end_time = time.time()
+    response_time = end_time - start_time
+
+    # Store interaction in the database
+    await run_blocking(record_interaction, db, query.question, result, response_time)
+
+    return result
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def compute_stream(question, index_version, priority, events):
+    # Streams the pipeline for the request that started the flight, passing
+    # its events on through the events queue, and returns the final response
+    # for the requests coalesced with it
+    response = None
+    try:
+        async for event, data in stream_rag_pipeline(question, priority):
+            if event in ("done", "error"):
+                response = await run_blocking(
+                    cache_response, question, data, index_version
+                )
+                if event == "done":
+                    data = response
+            events.put_nowait((event, data))
+    finally:
+        events.put_nowait(None)
+    return response
+
+
+async def queued_events(events):
+    while True:
+        item = await events.get()
+        if item is None:
+            return
+        yield item
+
+
+async def shared_events(task, question):
+    # A coalesced stream waits for the final response and replays it
+    try:
+        response = coalesced_response(await asyncio.shield(task), question)
+    except SchedulerBusy as e:
+        yield "error", {**error_result(question, e), "retry_after": e.retry_after}
+        return
+    except Exception as e:
+        yield "error", error_result(question, e)
+        return
+    if "error" in response:
+        yield "error", response
+        return
+    async for event in replay_result(response):
+        yield event
+
+
+def stream_flight(question, index_version, priority):
+    # Streams share in-flight answers with /query and /api/query: the first
+    # request streams live, the others get the finished answer in one go
+    events = asyncio.Queue()
+    task, shared = question_flights.start(
+        canonical_query(question),
+        lambda: compute_stream(question, index_version, priority, events),
+    )
+    if shared:
+        logger.info(f"Coalesced with an in-flight request: {question}")
+        return shared_events(task, question)
+    return queued_events(events)
 
-    return {
-        "question": result["question"],
-        "answer": result["answer"],
-        "retrieval_metrics": result["retrieval_metrics"],
-        "file_references": result.get("file_references", []),  # Add this line
-    }
+
+async def stream_answer(question, priority="interactive"):
+    start_time = time.time()
+    first_token_time = None
+    cached, index_version = await cached_response(question)
+    if cached is not None:
+        stream = replay_result(cached)
+    else:
+        stream = stream_flight(question, index_version, priority)
+
+    async for event, data in stream:
+        if event == "token" and first_token_time is None:
+            first_token_time = time.time() - start_time
+            logger.info(f"First token after {first_token_time:.2f}s: {question}")
+        if event in ("done", "error"):
+            response_time = time.time() - start_time
+            data = {**data, "time_to_first_token": first_token_time}
+            try:
+                data["interaction_id"] = await run_blocking(
+                    record_interaction_in_new_session, question, data, response_time
+                )
+            except Exception as e:
+                logger.error(f"Error recording interaction: {e}")
+        yield sse_event(event, data)
+
+
+@app.post("/api/query/stream")
+async def stream_query(request: Request):
+    # Server-sent events: "metadata" (retrieval metrics and file references)
+    # first, then one "token" event per generated token, then "done" with the
+    # full answer or "error"
+    data = await request.json()
+    if "text" not in data:
+        raise HTTPException(
+            status_code=422, detail="Missing 'text' field in request body"
+        )
+    priority = data.get("priority", "interactive")
+    check_priority(priority)
+    # Once the stream has started a full queue can only be reported as an
+    # error event, so turn the request away up front
+    scheduler.check_admission()
+    return StreamingResponse(
+        stream_answer(data["text"], priority),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.post("/feedback")
@@ -132,17 +356,16 @@ async def process_query(request: Request):
                 status_code=422, detail="Missing 'text' field in request body"
             )
         query_text = data["text"]
+        priority = data.get("priority", "interactive")
+        check_priority(priority)
 
         # Run the RAG pipeline
-        result = run_rag_pipeline(query_text)
+        result = await answer_query(query_text, priority)
         logger.info(f"Full RAG pipeline result: {result}")
 
-        return {
-            "question": result["question"],
-            "answer": result["answer"],
-            "retrieval_metrics": result["retrieval_metrics"],
-            "file_references": result.get("file_references", []),
-        }
+        return result
+    except (HTTPException, SchedulerBusy):
+        raise
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -200,6 +423,31 @@ async def get_dashboard_answer_metrics(db: Session = Depends(database.get_db)):
     return JSONResponse(content=metrics)
 
 
+@app.get("/api/dashboard/cache")
+async def get_dashboard_cache():
+    return {
+        "embedding_cache": get_embedding_cache().stats(),
+        "query_embedding_cache": query_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "response_cache": response_cache.stats(),
+    }
+
+
+@app.get("/api/dashboard/queue")
+async def get_dashboard_queue():
+    return scheduler.stats()
+
+
+@app.get("/api/dashboard/inflight")
+async def get_dashboard_inflight():
+    return question_flights.stats()
+
+
+@app.get("/api/dashboard/models")
+async def get_dashboard_models():
+    return {**model_stats(), "executor": executor_stats()}
+
+
 from fastapi import Depends
 from src.utils.service_locator import ServiceLocator
 
@@ -270,6 +518,12 @@ async def startup_event():
                 raise
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_async_client()
+    await close_async_es()
+
+
 @app.get("/api/dashboard/feedback")
 async def get_dashboard_feedback(db: Session = Depends(database.get_db)):
     feedback = db.query(models.Feedback).all()
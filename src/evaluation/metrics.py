@@ -1,15 +1,15 @@
 from sklearn.metrics.pairwise import cosine_similarity
-from sentence_transformers import SentenceTransformer
 import numpy as np
 from nltk.translate.bleu_score import sentence_bleu
 from rouge import Rouge
-
-model = SentenceTransformer("all-MiniLM-L6-v2")
+from src.models.embedding_cache import cached_encode, embed_query
+from src.models.model_registry import get_sentence_transformer
+from src.ingestion.reranking import document_vectors
 
 
 def calculate_relevance_score(query, document):
-    query_embedding = model.encode([query])
-    doc_embedding = model.encode([document])
+    query_embedding = embed_query(query)[None, :]
+    doc_embedding = cached_encode(get_sentence_transformer(), [document])
     return cosine_similarity(query_embedding, doc_embedding)[0][0]
 
 
@@ -28,8 +28,8 @@ def evaluate_relevance(question, retrieved_docs, top_k=3):
         return [0] * top_k
 
     # Encode the question and retrieved documents
-    question_embedding = model.encode(question)
-    doc_embeddings = model.encode([doc["content"] for doc in retrieved_docs])
+    question_embedding = embed_query(question)
+    doc_embeddings = document_vectors(retrieved_docs)
 
     # Calculate cosine similarities
     similarities = np.dot(doc_embeddings, question_embedding) / (
@@ -0,0 +1,74 @@
+import logging
+import time
+import numpy as np
+from src.evaluation.test_questions import test_questions
+from src.ingestion.elasticsearch_ingestion import encode_query
+from src.ingestion.vector_store import get_vector_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def recall_at_k(store, query_vectors, top_k, quantization, rescore_factor):
+    # Fraction of the exact float top-k that the quantized search also returns
+    recalls = []
+    start_time = time.time()
+    for query_vector in query_vectors:
+        exact = {
+            row for row, _ in store.search(query_vector, top_k, quantization="none")
+        }
+        approx = {
+            row
+            for row, _ in store.search(
+                query_vector,
+                top_k,
+                quantization=quantization,
+                rescore_factor=rescore_factor,
+            )
+        }
+        recalls.append(len(exact & approx) / len(exact) if exact else 1.0)
+    elapsed = time.time() - start_time
+    return sum(recalls) / len(recalls), elapsed / len(query_vectors)
+
+
+def evaluate_quantization(questions, top_k=5, rescore_factors=(1, 2, 4, 8)):
+    # Run against a store built with `python -m src.ingestion index local
+    # --quantization int8` (or binary)
+    store = get_vector_store()
+    if store.quantization == "none":
+        raise ValueError("The local vector store was built without quantization")
+    query_vectors = [np.asarray(encode_query(q["question"])) for q in questions]
+
+    results = {
+        "quantization": store.quantization,
+        "vectors_mb": store.vectors.nbytes / 1024 / 1024,
+        "codes_mb": store.codes.nbytes / 1024 / 1024,
+        "recall": {},
+    }
+    results["compression"] = store.vectors.nbytes / store.codes.nbytes
+    for rescore_factor in rescore_factors:
+        recall, seconds = recall_at_k(
+            store, query_vectors, top_k, store.quantization, rescore_factor
+        )
+        results["recall"][rescore_factor] = {
+            "recall": recall,
+            "ms_per_query": seconds * 1000,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    top_k = 5
+    results = evaluate_quantization(test_questions, top_k=top_k)
+
+    print(
+        f"\n{results['quantization']} codes: {results['codes_mb']:.2f} MB vs "
+        f"{results['vectors_mb']:.2f} MB float vectors "
+        f"({results['compression']:.0f}x smaller)"
+    )
+    for rescore_factor, metrics in results["recall"].items():
+        print(
+            f"  recall@{top_k} with a {rescore_factor * top_k}-candidate shortlist: "
+            f"{metrics['recall']:.4f} ({metrics['ms_per_query']:.2f} ms/query, "
+            "exact search included)"
+        )
@@ -23,7 +23,7 @@ def evaluate_retrieval_methods(test_questions, top_k=3):
 
         for question in tqdm(test_questions, desc="Batches"):
             relevant_docs = retrieve_relevant_documents(
-                question, method=method, top_k=top_k
+                question, method=method, top_k=top_k, fields="scoring"
             )
             relevance_scores = evaluate_relevance(question, relevant_docs, top_k=top_k)
             method_results.extend(relevance_scores)
@@ -0,0 +1,187 @@
+import argparse
+import logging
+import sys
+from .elasticsearch_ingestion import data_directory, INDEX_LAYOUT, INDEX_LAYOUTS
+from .indexing import (
+    full_index,
+    incremental_index,
+    watch_index,
+    verify_index,
+    build_local_store,
+)
+from .markdown_parsing import PARSE_WORKERS
+from .embedding import EMBED_BATCH_SIZE, EMBED_THREADS, configure_threads
+from .manifest import MANIFEST_PATH
+from .chunking import INGEST_CHUNKING, CHUNKING_MODES
+from .bulk import BULK_CHUNK_SIZE, BULK_MAX_CHUNK_BYTES, BULK_MAX_IN_FLIGHT
+from .vector_store import VECTOR_STORE_QUANTIZATION
+from .quantization import QUANTIZATION_METHODS
+
+logger = logging.getLogger(__name__)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m src.ingestion",
+        description="Index the D&D 5e SRD markdown corpus into Elasticsearch",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Build or update the index")
+    index_parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=["full", "incremental", "verify", "local"],
+        default="incremental",
+        help="full: drop and rebuild the index, incremental: only index new or "
+        "changed files and delete removed ones, verify: compare the index with "
+        "the files on disk, local: build the in-process stores used by "
+        "RETRIEVAL_BACKEND=local (default: incremental)",
+    )
+    index_parser.add_argument(
+        "--data-dir",
+        default=data_directory,
+        help=f"Directory containing the markdown files (default: {data_directory})",
+    )
+    index_parser.add_argument(
+        "--manifest",
+        default=MANIFEST_PATH,
+        help=f"Path of the ingestion manifest (default: {MANIFEST_PATH})",
+    )
+    index_parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="After an incremental run, keep polling the data directory and "
+        "apply edits as they happen",
+    )
+    index_parser.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Polling interval in seconds for --watch (default: 2)",
+    )
+    index_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help=f"Documents per embedding batch (default: {EMBED_BATCH_SIZE})",
+    )
+    index_parser.add_argument(
+        "--threads",
+        type=int,
+        default=EMBED_THREADS,
+        help="Torch CPU threads used for embedding, 0 keeps the torch default "
+        f"(default: {EMBED_THREADS})",
+    )
+    index_parser.add_argument(
+        "--workers",
+        type=int,
+        default=PARSE_WORKERS,
+        help=f"Processes used to parse markdown files (default: {PARSE_WORKERS})",
+    )
+    index_parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=BULK_CHUNK_SIZE,
+        help=f"Maximum documents per bulk request (default: {BULK_CHUNK_SIZE})",
+    )
+    index_parser.add_argument(
+        "--max-chunk-bytes",
+        type=int,
+        default=BULK_MAX_CHUNK_BYTES,
+        help=f"Maximum bytes per bulk request (default: {BULK_MAX_CHUNK_BYTES})",
+    )
+    index_parser.add_argument(
+        "--bulk-in-flight",
+        type=int,
+        default=BULK_MAX_IN_FLIGHT,
+        help=f"Maximum concurrent bulk requests (default: {BULK_MAX_IN_FLIGHT})",
+    )
+    index_parser.add_argument(
+        "--chunking",
+        choices=CHUNKING_MODES,
+        default=INGEST_CHUNKING,
+        help="document: one document per file, sections: split files at h2/h3 "
+        f"headings into token-capped chunks (default: {INGEST_CHUNKING})",
+    )
+    index_parser.add_argument(
+        "--layout",
+        choices=INDEX_LAYOUTS,
+        default=INDEX_LAYOUT,
+        help="standard: vectors in _source and nested tables/lists, lean: vectors "
+        f"only in doc values and flattened tables/lists (default: {INDEX_LAYOUT})",
+    )
+    index_parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATION_METHODS,
+        default=VECTOR_STORE_QUANTIZATION,
+        help="Quantized codes stored with the local vector store for a coarse "
+        f"first pass (default: {VECTOR_STORE_QUANTIZATION})",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    configure_threads(args.threads)
+    bulk_options = {
+        "chunk_size": args.chunk_size,
+        "max_chunk_bytes": args.max_chunk_bytes,
+        "max_in_flight": args.bulk_in_flight,
+    }
+
+    if args.watch:
+        if args.mode != "incremental":
+            logger.error("--watch can only be used with incremental indexing")
+            return 2
+        watch_index(
+            args.data_dir,
+            args.manifest,
+            args.interval,
+            args.batch_size,
+            args.workers,
+            bulk_options,
+            args.chunking,
+            args.layout,
+        )
+        return 0
+
+    if args.mode == "full":
+        result = full_index(
+            args.data_dir,
+            args.manifest,
+            args.batch_size,
+            args.workers,
+            bulk_options,
+            args.chunking,
+            args.layout,
+        )
+    elif args.mode == "incremental":
+        result = incremental_index(
+            args.data_dir,
+            args.manifest,
+            args.batch_size,
+            args.workers,
+            bulk_options,
+            args.chunking,
+            args.layout,
+        )
+    elif args.mode == "local":
+        result = build_local_store(
+            args.data_dir,
+            batch_size=args.batch_size,
+            workers=args.workers,
+            chunking=args.chunking,
+            quantization=args.quantization,
+        )
+    else:
+        result = verify_index(args.data_dir)
+        logger.info(f"Verification result: {result}")
+        return 0 if result["ok"] else 1
+
+    logger.info(f"Indexing result: {result}")
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+# Same boosts as the bm25 query sent to Elasticsearch (title^2, content)
+# which, like its multi_match (best_fields), scores a document by its best
+# field rather than the sum over fields
+BM25_FIELD_BOOSTS = {
+    "title": float(os.getenv("BM25_TITLE_BOOST", "2.0")),
+    "content": float(os.getenv("BM25_CONTENT_BOOST", "1.0")),
+}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+# In-process inverted index with one posting list per (field, term). Postings
+# are stored CSR style: the documents and term frequencies of term t in a
+# field are doc_ids[offsets[t]:offsets[t + 1]] and tfs[...] of that field.
+class BM25Index:
+    def __init__(self, ids, vocabulary, fields):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        # field -> {"offsets", "doc_ids", "tfs", "lengths", "avg_length"}
+        self.fields = fields
+
+    def __len__(self):
+        return len(self.ids)
+
+    def field_scores(self, field, term_ids, k1=BM25_K1, b=BM25_B):
+        postings = self.fields[field]
+        lengths = postings["lengths"]
+        length_norm = k1 * (1 - b + b * lengths / max(postings["avg_length"], 1e-9))
+        scores = np.zeros(len(self), dtype=np.float32)
+        for term_id in term_ids:
+            start, end = postings["offsets"][term_id : term_id + 2]
+            if start == end:
+                continue
+            docs = postings["doc_ids"][start:end]
+            tfs = postings["tfs"][start:end]
+            df = end - start
+            idf = np.log(1 + (len(self) - df + 0.5) / (df + 0.5))
+            # A document appears once per posting list, so no np.add.at needed
+            scores[docs] += idf * tfs * (k1 + 1) / (tfs + length_norm[docs])
+        return scores
+
+    def scores(self, query, boosts=None):
+        boosts = boosts or BM25_FIELD_BOOSTS
+        term_ids = {
+            self.vocabulary[term] for term in tokenize(query) if term in self.vocabulary
+        }
+        scores = np.zeros(len(self), dtype=np.float32)
+        for field, boost in boosts.items():
+            if boost:
+                np.maximum(
+                    scores, boost * self.field_scores(field, term_ids), out=scores
+                )
+        return scores
+
+    def search(self, query, top_k=10, boosts=None, mask=None):
+        # Returns [(row, score)] best first; documents without any query term
+        # are never returned
+        if not len(self) or top_k <= 0:
+            return []
+        scores = self.scores(query, boosts)
+        if mask is not None:
+            scores[~mask] = 0
+        matching = np.flatnonzero(scores > 0)
+        if len(matching) > top_k:
+            matching = matching[np.argpartition(-scores[matching], top_k - 1)[:top_k]]
+        matching = matching[np.argsort(-scores[matching], kind="stable")]
+        return [(int(row), float(scores[row])) for row in matching]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        arrays = {}
+        for field, postings in self.fields.items():
+            for name in ("offsets", "doc_ids", "tfs", "lengths"):
+                arrays[f"{field}.{name}"] = postings[name]
+        path = os.path.join(directory, "bm25.npz")
+        np.savez(f"{path}.tmp.npz", **arrays)
+        terms_path = os.path.join(directory, "bm25_terms.json")
+        with open(f"{terms_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "ids": self.ids,
+                    "terms": sorted(self.vocabulary, key=self.vocabulary.get),
+                    "fields": list(self.fields),
+                },
+                f,
+            )
+        os.replace(f"{path}.tmp.npz", path)
+        os.replace(f"{terms_path}.tmp", terms_path)
+        size = sum(array.nbytes for array in arrays.values())
+        logger.info(
+            f"Wrote BM25 index with {len(self.vocabulary)} terms and "
+            f"{len(self)} documents ({size / 1024 / 1024:.1f} MB) to {directory}"
+        )
+
+
+def build_bm25_index(documents, fields=("title", "content")):
+    # documents is a sequence of (doc_id, source) pairs
+    ids = []
+    vocabulary = {}
+    counts = {field: [] for field in fields}
+    for doc_id, source in documents:
+        ids.append(doc_id)
+        for field in fields:
+            field_counts = Counter(tokenize(source.get(field)))
+            for term in field_counts:
+                vocabulary.setdefault(term, len(vocabulary))
+            counts[field].append(field_counts)
+
+    index_fields = {}
+    for field in fields:
+        per_term = [[] for _ in vocabulary]
+        for row, field_counts in enumerate(counts[field]):
+            for term, tf in field_counts.items():
+                per_term[vocabulary[term]].append((row, tf))
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings) for postings in per_term])
+        flat = [posting for postings in per_term for posting in postings]
+        lengths = np.array(
+            [sum(field_counts.values()) for field_counts in counts[field]],
+            dtype=np.float32,
+        )
+        index_fields[field] = {
+            "offsets": offsets,
+            "doc_ids": np.array([row for row, _ in flat], dtype=np.int32),
+            "tfs": np.array([tf for _, tf in flat], dtype=np.float32),
+            "lengths": lengths,
+            "avg_length": float(lengths.mean()) if len(lengths) else 0.0,
+        }
+    return BM25Index(ids, vocabulary, index_fields)
+
+
+def load_bm25_index(directory):
+    with open(os.path.join(directory, "bm25_terms.json"), "r", encoding="utf-8") as f:
+        stored = json.load(f)
+    vocabulary = {term: i for i, term in enumerate(stored["terms"])}
+    with np.load(os.path.join(directory, "bm25.npz")) as arrays:
+        fields = {}
+        for field in stored["fields"]:
+            postings = {
+                name: arrays[f"{field}.{name}"]
+                for name in ("offsets", "doc_ids", "tfs", "lengths")
+            }
+            lengths = postings["lengths"]
+            postings["avg_length"] = float(lengths.mean()) if len(lengths) else 0.0
+            fields[field] = postings
+    return BM25Index(stored["ids"], vocabulary, fields)
+
+
+_index = None
+_index_key = None
+_index_lock = threading.Lock()
+
+
+def get_bm25_index(directory):
+    # Reloads the index when it has been rebuilt since it was last opened
+    global _index, _index_key
+    terms_path = os.path.join(directory, "bm25_terms.json")
+    if not os.path.exists(terms_path):
+        raise FileNotFoundError(
+            f"No BM25 index in {directory}, build it with "
+            "`python -m src.ingestion index local`"
+        )
+    with _index_lock:
+        key = (directory, os.path.getmtime(terms_path))
+        if _index is None or key != _index_key:
+            _index = load_bm25_index(directory)
+            _index_key = key
+            logger.info(f"Loaded BM25 index with {len(_index)} documents")
+        return _index
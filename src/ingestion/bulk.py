@@ -0,0 +1,145 @@
+import os
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from elasticsearch import helpers
+from elasticsearch.serializer import JsonSerializer
+
+logger = logging.getLogger(__name__)
+
+# Chunks are capped by both document count and serialized size
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "200"))
+BULK_MAX_CHUNK_BYTES = int(os.getenv("BULK_MAX_CHUNK_BYTES", str(10 * 1024 * 1024)))
+# Maximum number of bulk requests in flight at once
+BULK_MAX_IN_FLIGHT = int(os.getenv("BULK_MAX_IN_FLIGHT", "2"))
+# Retries with exponential backoff for documents rejected with 429
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", "5"))
+BULK_INITIAL_BACKOFF = float(os.getenv("BULK_INITIAL_BACKOFF", "2"))
+BULK_MAX_BACKOFF = float(os.getenv("BULK_MAX_BACKOFF", "60"))
+
+
+def serialize_action(action, serializer):
+    # Serializes the source once, both to size the action and to send it: the
+    # bulk helper passes bytes through as they are. Returns (action, size on
+    # the wire), counting ~100 bytes for the metadata line.
+    source = action.get("_source")
+    if isinstance(source, dict):
+        source = serializer.dumps(source)
+        action = {**action, "_source": source}
+    return action, 100 + len(source or b"")
+
+
+def chunk_actions(
+    actions,
+    chunk_size=BULK_CHUNK_SIZE,
+    max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+    serializer=None,
+):
+    # A single action larger than max_chunk_bytes is sent as a chunk of its own
+    serializer = serializer or JsonSerializer()
+    chunk = []
+    chunk_bytes = 0
+    for action in actions:
+        action, size = serialize_action(action, serializer)
+        if chunk and (len(chunk) >= chunk_size or chunk_bytes + size > max_chunk_bytes):
+            yield chunk, chunk_bytes
+            chunk = []
+            chunk_bytes = 0
+        chunk.append(action)
+        chunk_bytes += size
+    if chunk:
+        yield chunk, chunk_bytes
+
+
+def send_chunk(
+    es,
+    chunk,
+    chunk_bytes,
+    max_retries=BULK_MAX_RETRIES,
+    initial_backoff=BULK_INITIAL_BACKOFF,
+    max_backoff=BULK_MAX_BACKOFF,
+):
+    # streaming_bulk retries documents rejected with 429 using exponential
+    # backoff; the chunk has already been sized so it is sent as one request.
+    start_time = time.time()
+    success = 0
+    errors = []
+    for ok, item in helpers.streaming_bulk(
+        es,
+        chunk,
+        chunk_size=len(chunk),
+        max_chunk_bytes=max(chunk_bytes * 2, 1),
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        max_backoff=max_backoff,
+        raise_on_error=False,
+        raise_on_exception=False,
+    ):
+        if ok:
+            success += 1
+        else:
+            errors.append(item)
+    elapsed = time.time() - start_time
+    logger.info(
+        f"Bulk chunk: {len(chunk)} actions, {chunk_bytes / 1024:.0f} KB in "
+        f"{elapsed:.2f}s ({len(chunk) / elapsed if elapsed else 0:.0f} docs/s, "
+        f"{chunk_bytes / 1024 / 1024 / elapsed if elapsed else 0:.2f} MB/s)"
+    )
+    return success, errors
+
+
+def bulk_index(
+    es,
+    actions,
+    chunk_size=BULK_CHUNK_SIZE,
+    max_chunk_bytes=BULK_MAX_CHUNK_BYTES,
+    max_in_flight=BULK_MAX_IN_FLIGHT,
+    max_retries=BULK_MAX_RETRIES,
+    initial_backoff=BULK_INITIAL_BACKOFF,
+    max_backoff=BULK_MAX_BACKOFF,
+):
+    # Streaming replacement for helpers.bulk(stats_only=False,
+    # raise_on_error=False). Actions are pulled from the iterator only when a
+    # request slot is free, so memory stays bounded by max_in_flight chunks.
+    start_time = time.time()
+    success = 0
+    failed = []
+    total_bytes = 0
+    max_in_flight = max(1, max_in_flight)
+    serializer = es.transport.serializers.get_serializer("application/json")
+
+    def collect(future):
+        nonlocal success
+        chunk_success, chunk_errors = future.result()
+        success += chunk_success
+        failed.extend(chunk_errors)
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        pending = deque()
+        for chunk, chunk_bytes in chunk_actions(
+            actions, chunk_size, max_chunk_bytes, serializer
+        ):
+            if len(pending) >= max_in_flight:
+                collect(pending.popleft())
+            total_bytes += chunk_bytes
+            pending.append(
+                executor.submit(
+                    send_chunk,
+                    es,
+                    chunk,
+                    chunk_bytes,
+                    max_retries,
+                    initial_backoff,
+                    max_backoff,
+                )
+            )
+        while pending:
+            collect(pending.popleft())
+
+    elapsed = time.time() - start_time
+    logger.info(
+        f"Bulk indexing finished: {success} succeeded, {len(failed)} failed, "
+        f"{total_bytes / 1024 / 1024:.1f} MB in {elapsed:.2f}s"
+    )
+    return success, failed
@@ -0,0 +1,82 @@
+import os
+import re
+
+# "document" indexes one document per markdown file, "sections" splits each
+# file at h2/h3 headings into chunks that link back to their parent file.
+INGEST_CHUNKING = os.getenv("INGEST_CHUNKING", "document")
+CHUNKING_MODES = ("document", "sections")
+
+# Chunk size is measured in whitespace-delimited tokens. The defaults stay
+# below the 256 word pieces all-MiniLM-L6-v2 embeds before truncating.
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "160"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+SECTION_HEADINGS = ["h2", "h3"]
+
+
+def split_sections(soup):
+    # Walks the top-level elements and starts a new section at every h2/h3.
+    # Returns a list of (heading, text, elements) triples; text includes the
+    # heading and elements are the section's top-level elements.
+    sections = []
+    heading = None
+    parts = []
+    elements = []
+    for element in soup.contents:
+        name = getattr(element, "name", None)
+        if name in SECTION_HEADINGS:
+            if parts:
+                sections.append((heading, "\n".join(parts), elements))
+            heading = element.get_text(strip=True)
+            parts = []
+            elements = []
+        text = (
+            element.get_text(separator="\n", strip=True)
+            if name
+            else str(element).strip()
+        )
+        if text:
+            parts.append(text)
+        elements.append(element)
+    if parts:
+        sections.append((heading, "\n".join(parts), elements))
+    return sections
+
+
+def split_tokens(text, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS):
+    # Cuts text into windows of at most max_tokens tokens, each window starting
+    # overlap tokens before the end of the previous one. Slices of the original
+    # text are returned so line breaks are preserved.
+    spans = [match.span() for match in re.finditer(r"\S+", text)]
+    if len(spans) <= max_tokens:
+        return [text] if spans else []
+    step = max(1, max_tokens - overlap)
+    windows = []
+    for start in range(0, len(spans), step):
+        window = spans[start : start + max_tokens]
+        windows.append(text[window[0][0] : window[-1][1]])
+        if start + max_tokens >= len(spans):
+            break
+    return windows
+
+
+def build_chunks(
+    document, sections, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS
+):
+    # sections are (heading, text, nested) triples. Chunks carry the parent's
+    # metadata, and instead of the whole file's tables and lists they get the
+    # section's own from nested; every window of a section shares them.
+    chunks = []
+    for heading, text, nested in sections:
+        for piece in split_tokens(text, max_tokens, overlap):
+            chunk = {
+                key: value
+                for key, value in document.items()
+                if key not in ("content", "tables", "lists")
+            }
+            chunk.update(nested)
+            chunk["section"] = heading or document["title"]
+            chunk["content"] = piece
+            chunk["chunk_index"] = len(chunks)
+            chunks.append(chunk)
+    return chunks
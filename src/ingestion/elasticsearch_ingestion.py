@@ -1,21 +1,23 @@
 import os
+import asyncio
+import weakref
 from dotenv import load_dotenv
-import hashlib
-import markdown
-from bs4 import BeautifulSoup
-from elasticsearch import Elasticsearch, helpers, NotFoundError, ConnectionError
+from elasticsearch import (
+    Elasticsearch,
+    AsyncElasticsearch,
+    ConnectionError,
+)
 import logging
-import json
-import re
-from src.utils.config import ES_HOST, ES_INDEX_NAME
 import numpy as np
-from sentence_transformers import SentenceTransformer, util
 from .query_rewriting import rewrite_and_expand_query
-from .query_processing import rewrite_user_query
 from .reranking import rerank_documents
+from .vector_store import get_vector_store
+from .bm25_index import get_bm25_index
+from .manifest import hash_file
+from src.models.embedding_cache import embed_query
+from src.models.model_registry import get_sentence_transformer
+from src.utils.executor import run_blocking
 import time
-import yaml
-from pathlib import Path
 
 # Load environment variables
 load_dotenv()
@@ -35,16 +37,79 @@ ES_INDEX_NAME = os.getenv("ES_INDEX_NAME", "dnd_5e_srd")
 # Directory containing your Markdown files
 data_directory = os.getenv("DATA_DIRECTORY", "./data/dnd_srd")
 
+# Reciprocal-rank fusion for hybrid retrieval: each list contributes
+# weight / (HYBRID_RRF_K + rank) to a document's score
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("HYBRID_LEXICAL_WEIGHT", "1.0"))
+HYBRID_VECTOR_WEIGHT = float(os.getenv("HYBRID_VECTOR_WEIGHT", "1.0"))
+
+# "elasticsearch" runs searches in ES, "local" runs them in-process against
+# the stores built by `python -m src.ingestion index local`
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "elasticsearch")
+RETRIEVAL_BACKENDS = ("elasticsearch", "local")
+# Field boosts of the local lexical methods; None uses BM25_FIELD_BOOSTS,
+# mirroring the title^2 + content bm25 query
+LOCAL_LEXICAL_BOOSTS = {"keyword": {"content": 1.0}, "bm25": None}
+
+# "standard" stores vectors in _source and tables/lists as nested documents.
+# "lean" keeps vectors out of _source (they only live in the vector doc values)
+# and stores tables/lists as flattened text, so each file is one Lucene doc.
+INDEX_LAYOUT = os.getenv("INDEX_LAYOUT", "standard")
+INDEX_LAYOUTS = ("standard", "lean")
+
+# Seconds between checks of whether the index has been rebuilt or updated
+INDEX_VERSION_CHECK_INTERVAL = float(os.getenv("INDEX_VERSION_CHECK_INTERVAL", "5"))
+
+# _source allowlists per use case. The vector, term list and nested
+# tables/lists are only returned when asked for.
+SOURCE_FIELDS = {
+    # Building the LLM context
+    "context": ["title", "content", "file_path", "parent_id", "section"],
+    # Reranking and relevance evaluation
+    "scoring": [
+        "title",
+        "content",
+        "file_path",
+        "parent_id",
+        "section",
+        "content_vector",
+        "content_terms",
+    ],
+}
+
+
+def source_fields(fields):
+    # fields is a use case from SOURCE_FIELDS, an explicit list, or None for
+    # the full _source
+    if fields is None or isinstance(fields, list):
+        return fields
+    return SOURCE_FIELDS[fields]
+
+
+def hits_to_documents(hits):
+    documents = [hit["_source"] for hit in hits]
+    for doc, hit in zip(documents, hits):
+        doc["_id"] = hit["_id"]
+        doc["_score"] = hit["_score"]
+    return documents
+
+
+def select_fields(doc, fields):
+    return {
+        key: value
+        for key, value in doc.items()
+        if key in fields or key in ("_id", "_score")
+    }
+
+
+def es_auth():
+    return (ES_USERNAME, ES_PASSWORD) if ES_USERNAME and ES_PASSWORD else None
+
 
 def get_elasticsearch_client(max_retries=30, delay=10):
     for i in range(max_retries):
         try:
-            es = Elasticsearch(
-                [ES_HOST],
-                http_auth=(
-                    (ES_USERNAME, ES_PASSWORD) if ES_USERNAME and ES_PASSWORD else None
-                ),
-            )
+            es = Elasticsearch([ES_HOST], http_auth=es_auth())
             if es.ping():
                 logger.info("Successfully connected to Elasticsearch")
                 return es
@@ -68,121 +133,56 @@ def delete_index_if_exists(es, index_name):
 
 
 def initialize_elasticsearch():
-    es = get_elasticsearch_client()
+    es = get_es()
     if not es.indices.exists(index=ES_INDEX_NAME):
         create_index_with_mapping()
     return es
 
 
-# Global Elasticsearch client
-es = get_elasticsearch_client()
-
-# Initialize the SentenceTransformer model
-model = SentenceTransformer("all-MiniLM-L6-v2")
-
-
-def get_document_id(file_path):
-    with open(file_path, "rb") as file:
-        return hashlib.md5(file.read()).hexdigest()
-
-
-def get_category_subcategory(file_path):
-    parts = file_path.split(os.sep)
-    category = parts[-2] if len(parts) > 1 else "Uncategorized"
-    subcategory = os.path.splitext(parts[-1])[0]
-    return category, subcategory
-
+# Shared Elasticsearch client, created on first use so that importing this
+# module has no side effects; indexing is run explicitly through
+# `python -m src.ingestion index`. The embedding model comes from the shared
+# model registry.
+_es = None
 
-def extract_tags(content):
-    # Extract tags from content (e.g., based on headers or specific patterns)
-    tags = re.findall(r"#(\w+)", content)
-    return list(set(tags))
 
+def get_es():
+    global _es
+    if _es is None:
+        _es = get_elasticsearch_client()
+    return _es
 
-def parse_tables(soup):
-    tables = []
-    for table in soup.find_all("table"):
-        title = table.find_previous(["h1", "h2", "h3", "h4", "h5", "h6"])
-        title = title.text if title else "Untitled Table"
-        content = str(table)
-        tables.append({"title": title, "content": content})
-    return tables
 
+# One async client per event loop for the API's request path. It uses the
+# httpx transport, so no extra HTTP library is needed.
+_async_es = weakref.WeakKeyDictionary()
 
-def parse_lists(soup):
-    lists = []
-    for list_elem in soup.find_all(["ul", "ol"]):
-        title = list_elem.find_previous(["h1", "h2", "h3", "h4", "h5", "h6"])
-        title = title.text if title else "Untitled List"
-        items = [li.text for li in list_elem.find_all("li")]
-        lists.append({"title": title, "items": items})
-    return lists
-
-
-def determine_document_type(file_path):
-    folder_name = os.path.basename(os.path.dirname(file_path)).lower()
-    return folder_name.replace(" ", "_")
 
+def get_async_es():
+    loop = asyncio.get_running_loop()
+    es = _async_es.get(loop)
+    if es is None:
+        es = AsyncElasticsearch([ES_HOST], http_auth=es_auth(), node_class="httpxasync")
+        _async_es[loop] = es
+    return es
 
-def read_markdown_file(file_path):
-    logger.info(f"Reading markdown file: {file_path}")
-    try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            content = file.read()
 
-        # Convert Markdown to HTML
-        html = markdown.markdown(content, extensions=["tables"])
+async def close_async_es():
+    es = _async_es.pop(asyncio.get_running_loop(), None)
+    if es is not None:
+        await es.close()
 
-        # Parse HTML with BeautifulSoup
-        soup = BeautifulSoup(html, "html.parser")
 
-        # Extract title
-        title = soup.find(["h1", "h2", "h3"])
-        title = (
-            title.text if title else os.path.splitext(os.path.basename(file_path))[0]
-        )
+def get_model():
+    return get_sentence_transformer()
 
-        # Remove title from content
-        if title:
-            title_tag = soup.find(["h1", "h2", "h3"])
-            title_tag.extract()
-
-        # Extract main content
-        main_content = soup.get_text(separator="\n", strip=True)
-
-        # Extract category, subcategory, and tags
-        category, subcategory = get_category_subcategory(file_path)
-        tags = extract_tags(content)
-
-        # Parse tables and lists
-        tables = parse_tables(soup)
-        lists = parse_lists(soup)
-
-        # Determine document type
-        doc_type = determine_document_type(file_path)
-
-        # Create document
-        document = {
-            "title": title,
-            "content": main_content,
-            "category": category,
-            "subcategory": subcategory,
-            "tags": tags,
-            "file_path": file_path,
-            "tables": tables,
-            "lists": lists,
-            "content_vector": model.encode(main_content).tolist(),
-            "type": doc_type,  # Add the document type
-        }
 
-        logger.info(f"Successfully processed file: {file_path}")
-        return document
-    except Exception as e:
-        logger.error(f"Error processing file {file_path}: {str(e)}")
-        return None
+def get_document_id(file_path):
+    # Documents are keyed by the content hash the manifest records
+    return hash_file(file_path)
 
 
-def create_index_with_mapping():
+def create_index_with_mapping(layout=INDEX_LAYOUT):
     mapping = {
         "mappings": {
             "properties": {
@@ -215,268 +215,523 @@ def create_index_with_mapping():
                     "dims": 384,  # Adjust this to match your model's output dimension
                 },
                 "type": {"type": "keyword"},
+                # Section chunks link back to the file they were split from;
+                # whole-file documents are their own parent.
+                "parent_id": {"type": "keyword"},
+                "section": {"type": "text"},
+                "chunk_index": {"type": "integer"},
+                # Precomputed for reranking; only read back from _source
+                "content_terms": {
+                    "type": "keyword",
+                    "index": False,
+                    "doc_values": False,
+                },
             }
         }
     }
-
+    if layout == "lean":
+        properties = mapping["mappings"]["properties"]
+        del properties["tables"]
+        del properties["lists"]
+        properties["tables_text"] = {"type": "text"}
+        properties["lists_text"] = {"type": "text"}
+        # Reranking falls back to the embedding cache for these vectors
+        mapping["mappings"]["_source"] = {"excludes": ["content_vector"]}
+
+    es = get_es()
     if es.indices.exists(index=ES_INDEX_NAME):
         es.indices.delete(index=ES_INDEX_NAME)
         logger.info(f"Deleted existing index: {ES_INDEX_NAME}")
 
     es.indices.create(index=ES_INDEX_NAME, body=mapping)
-    logger.info(f"Created index with mapping: {ES_INDEX_NAME}")
-
-
-def reindex_documents():
-    # Get all documents from the data directory
-    documents = []
-    for root, dirs, files in os.walk(data_directory):
-        for file in files:
-            if file.endswith(".md"):
-                file_path = os.path.join(root, file)
-                document = read_markdown_file(file_path)
-                if document:
-                    documents.append(document)
-
-    # Prepare documents for indexing
-    actions = []
-    for doc in documents:
-        doc_id = get_document_id(doc["file_path"])
-        actions.append(
-            {
-                "_op_type": "index",
-                "_index": ES_INDEX_NAME,
-                "_id": doc_id,
-                "_source": doc,
-            }
-        )
+    logger.info(f"Created index with {layout} mapping: {ES_INDEX_NAME}")
+
+
+def mark_index_updated(es, index_name=ES_INDEX_NAME):
+    # Records when the content of the index last changed in the mapping _meta,
+    # which is what get_index_version() reads
+    es.indices.put_mapping(
+        index=index_name, body={"_meta": {"updated_at": time.time()}}
+    )
+
 
-    # Index documents
-    helpers.bulk(es, actions)
-    logger.info(f"Indexed {len(actions)} documents")
+def version_from_info(info):
+    # A full rebuild recreates the index (new uuid), an incremental run
+    # updates _meta.updated_at
+    updated_at = info["mappings"].get("_meta", {}).get("updated_at")
+    return f"{info['settings']['index']['uuid']}:{updated_at}"
+
+
+def read_index_version(backend=RETRIEVAL_BACKEND, index_name=ES_INDEX_NAME):
+    if backend == "local":
+        return f"local:{get_vector_store().meta['built_at']}"
+    return version_from_info(get_es().indices.get(index=index_name)[index_name])
+
+
+async def read_index_version_async(backend=RETRIEVAL_BACKEND, index_name=ES_INDEX_NAME):
+    if backend == "local":
+        return await run_blocking(read_index_version, backend, index_name)
+    info = await get_async_es().indices.get(index=index_name)
+    return version_from_info(info[index_name])
+
+
+# backend -> (version, time of the check)
+_index_versions = {}
+
+
+def cached_index_version(backend):
+    # Returns (is fresh, version)
+    version, checked_at = _index_versions.get(backend, (None, None))
+    fresh = (
+        checked_at is not None
+        and time.monotonic() - checked_at < INDEX_VERSION_CHECK_INTERVAL
+    )
+    return fresh, version
+
+
+def get_index_version(backend=RETRIEVAL_BACKEND):
+    # Identifies the current contents of the index, checked at most every
+    # INDEX_VERSION_CHECK_INTERVAL seconds; None when it cannot be read
+    fresh, version = cached_index_version(backend)
+    if not fresh:
+        try:
+            version = read_index_version(backend)
+        except Exception as e:
+            logger.warning(f"Could not read the {backend} index version: {e}")
+            version = None
+        _index_versions[backend] = (version, time.monotonic())
+    return version
+
+
+async def get_index_version_async(backend=RETRIEVAL_BACKEND):
+    fresh, version = cached_index_version(backend)
+    if not fresh:
+        try:
+            version = await read_index_version_async(backend)
+        except Exception as e:
+            logger.warning(f"Could not read the {backend} index version: {e}")
+            version = None
+        _index_versions[backend] = (version, time.monotonic())
+    return version
 
 
 # Add this function before the retrieve_relevant_documents function
 def encode_query(query):
-    return model.encode(query).tolist()
+    return embed_query(query).tolist()
 
 
-def retrieve_relevant_documents(
-    query, method="semantic", top_k=5, rerank=True, rewrite_query=True
+def keyword_query(query, size):
+    return {"query": {"match": {"content": query}}, "size": size}
+
+
+def bm25_query(query, size):
+    # Title and content, used by the bm25 method and the lexical side of hybrid
+    return {
+        "query": {
+            "multi_match": {
+                "query": query,
+                "fields": ["title^2", "content"],
+                "fuzziness": "AUTO",
+            }
+        },
+        "size": size,
+    }
+
+
+def fuzzy_content_query(query, size):
+    # The original bm25_search query: content only, with fuzzy matching
+    return {
+        "query": {"match": {"content": {"query": query, "fuzziness": "AUTO"}}},
+        "size": size,
+    }
+
+
+def semantic_query(query, size, query_vector=None):
+    return {
+        "query": {
+            "script_score": {
+                "query": {
+                    "bool": {
+                        "must": [{"match": {"content": query}}],
+                        "should": [
+                            {"match_phrase": {"content": phrase}}
+                            for phrase in query.split()
+                        ],
+                    }
+                },
+                "script": {
+                    "source": "cosineSimilarity(params.query_vector, 'content_vector') + 1.0",
+                    "params": {"query_vector": query_vector or encode_query(query)},
+                },
+            }
+        },
+        "size": size,
+    }
+
+
+def vector_query(query_vector, size):
+    # Pure vector ranking over all documents, used as the vector side of hybrid
+    return {
+        "query": {
+            "script_score": {
+                "query": {"match_all": {}},
+                "script": {
+                    "source": "cosineSimilarity(params.query_vector, 'content_vector') + 1.0",
+                    "params": {"query_vector": query_vector},
+                },
+            }
+        },
+        "size": size,
+    }
+
+
+SEARCH_QUERIES = {
+    "keyword": keyword_query,
+    "bm25": bm25_query,
+    "semantic": semantic_query,
+}
+
+
+def reciprocal_rank_fusion(hit_lists, weights=None, k=HYBRID_RRF_K):
+    # Each document scores sum(weight / (k + rank)) over the lists it appears
+    # in. Returns hits ordered by fused score, with _score replaced by it.
+    weights = weights or [1.0] * len(hit_lists)
+    fused = {}
+    for hits, weight in zip(hit_lists, weights):
+        for rank, hit in enumerate(hits, 1):
+            entry = fused.setdefault(hit["_id"], [hit, 0.0])
+            entry[1] += weight / (k + rank)
+    ranked = sorted(fused.values(), key=lambda entry: entry[1], reverse=True)
+    return [dict(hit, _score=score) for hit, score in ranked]
+
+
+def collapse_hits(hits):
+    # Keeps the best hit of each parent document
+    seen = set()
+    collapsed = []
+    for hit in hits:
+        parent_id = hit["_source"].get("parent_id", hit["_id"])
+        if parent_id not in seen:
+            seen.add(parent_id)
+            collapsed.append(hit)
+    return collapsed
+
+
+def apply_filters(search_body, filters):
+    # filters maps a keyword field (e.g. category or type) to one value or a
+    # list of allowed values
+    if filters:
+        search_body["query"] = {
+            "bool": {
+                "must": [search_body["query"]],
+                "filter": [
+                    {"terms": {field: [values] if isinstance(values, str) else values}}
+                    for field, values in filters.items()
+                ],
+            }
+        }
+    return search_body
+
+
+def local_vector_hits(query, size, filters=None, source=None):
+    # Same hit format as ES, with the same cosine + 1.0 score scale as the
+    # script_score queries
+    store = get_vector_store()
+    return [
+        {
+            "_id": store.ids[row],
+            "_score": score + 1.0,
+            "_source": store.source(row, source),
+        }
+        for row, score in store.search(np.asarray(encode_query(query)), size, filters)
+    ]
+
+
+def local_lexical_hits(query, size, method="bm25", filters=None, source=None):
+    store = get_vector_store()
+    index = get_bm25_index(store.directory)
+    if len(index) != len(store):
+        raise RuntimeError(
+            "The local BM25 index and vector store are out of sync, rebuild them "
+            "with `python -m src.ingestion index local`"
+        )
+    boosts = LOCAL_LEXICAL_BOOSTS[method]
+    mask = store.filter_mask(filters) if filters else None
+    return [
+        {"_id": store.ids[row], "_score": score, "_source": store.source(row, source)}
+        for row, score in index.search(query, size, boosts, mask)
+    ]
+
+
+def local_hits(
+    query, method, size, collapse_by_parent=False, filters=None, source=None
 ):
+    # Over-fetch when collapsing since several chunks of a file may rank high
+    limit = size * 4 if collapse_by_parent else size
+    if method == "semantic":
+        hits = local_vector_hits(query, limit, filters, source)
+    elif method == "hybrid":
+        hits = reciprocal_rank_fusion(
+            [
+                local_lexical_hits(query, limit, "bm25", filters, source),
+                local_vector_hits(query, limit, filters, source),
+            ],
+            [HYBRID_LEXICAL_WEIGHT, HYBRID_VECTOR_WEIGHT],
+        )
+    else:
+        hits = local_lexical_hits(query, limit, method, filters, source)
+    if collapse_by_parent:
+        hits = collapse_hits(hits)
+    return hits[:size]
+
+
+def es_search_bodies(
+    query, method, size, collapse_by_parent=False, filters=None, source=None
+):
+    # One search body, or the lexical and vector sub-queries of hybrid
+    if method == "hybrid":
+        bodies = [bm25_query(query, size), vector_query(encode_query(query), size)]
+    else:
+        bodies = [SEARCH_QUERIES[method](query, size)]
+    for search_body in bodies:
+        apply_filters(search_body, filters)
+        if source is not None:
+            search_body["_source"] = source
+        if collapse_by_parent:
+            # Keep only the best matching chunk of each source file
+            search_body["collapse"] = {"field": "parent_id"}
+    return bodies
+
+
+def msearch_body(bodies, index_name=ES_INDEX_NAME):
+    searches = []
+    for search_body in bodies:
+        searches.extend([{"index": index_name}, search_body])
+    return searches
+
+
+def fuse_responses(
+    responses,
+    size,
+    collapse_by_parent=False,
+    lexical_weight=HYBRID_LEXICAL_WEIGHT,
+    vector_weight=HYBRID_VECTOR_WEIGHT,
+):
+    hit_lists = []
+    for response in responses:
+        if "error" in response:
+            logger.error(f"Hybrid sub-query failed: {response['error']}")
+            hit_lists.append([])
+        else:
+            hit_lists.append(response["hits"]["hits"])
+    hits = reciprocal_rank_fusion(hit_lists, [lexical_weight, vector_weight])
+    if collapse_by_parent:
+        # The two lists may return different chunks of the same file
+        hits = collapse_hits(hits)
+    return hits[:size]
+
+
+def hybrid_hits(
+    query,
+    size,
+    index_name=ES_INDEX_NAME,
+    collapse_by_parent=False,
+    lexical_weight=HYBRID_LEXICAL_WEIGHT,
+    vector_weight=HYBRID_VECTOR_WEIGHT,
+    source=None,
+    filters=None,
+):
+    # Lexical and vector sub-queries go out together in one _msearch request
+    # and are fused client-side.
+    bodies = es_search_bodies(
+        query, "hybrid", size, collapse_by_parent, filters, source
+    )
+    responses = get_es().msearch(body=msearch_body(bodies, index_name))["responses"]
+    return fuse_responses(
+        responses, size, collapse_by_parent, lexical_weight, vector_weight
+    )
+
+
+def search_hits(
+    query,
+    method,
+    size,
+    backend=RETRIEVAL_BACKEND,
+    collapse_by_parent=False,
+    filters=None,
+    source=None,
+):
+    if backend == "local":
+        return local_hits(query, method, size, collapse_by_parent, filters, source)
+
+    if method == "hybrid":
+        return hybrid_hits(
+            query,
+            size,
+            collapse_by_parent=collapse_by_parent,
+            source=source,
+            filters=filters,
+        )
+    (search_body,) = es_search_bodies(
+        query, method, size, collapse_by_parent, filters, source
+    )
+    results = get_es().search(index=ES_INDEX_NAME, body=search_body)
+    return results["hits"]["hits"]
+
+
+async def search_hits_async(
+    query,
+    method,
+    size,
+    backend=RETRIEVAL_BACKEND,
+    collapse_by_parent=False,
+    filters=None,
+    source=None,
+):
+    # Same as search_hits, with the Elasticsearch requests awaited and the
+    # CPU work (encoding the query, local search) on the bounded executor
+    if backend == "local":
+        return await run_blocking(
+            local_hits, query, method, size, collapse_by_parent, filters, source
+        )
+
+    bodies = await run_blocking(
+        es_search_bodies, query, method, size, collapse_by_parent, filters, source
+    )
+    es = get_async_es()
+    if method == "hybrid":
+        responses = await es.msearch(body=msearch_body(bodies))
+        return fuse_responses(responses["responses"], size, collapse_by_parent)
+    results = await es.search(index=ES_INDEX_NAME, body=bodies[0])
+    return results["hits"]["hits"]
+
+
+def prepare_retrieval(query, method, rerank, rewrite_query, fields, backend):
+    # Returns the (rewritten) query, the requested fields and the _source
+    # fields to search with
+    if method not in SEARCH_QUERIES and method != "hybrid":
+        raise ValueError(f"Unknown retrieval method: {method}")
+    if backend not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"Unknown retrieval backend: {backend}")
+
     if rewrite_query:
         original_query = query
         query = rewrite_and_expand_query(query)
         print(f"Original query: {original_query}")
         print(f"Rewritten query: {query}")
 
-    if method == "semantic":
-        search_body = {
-            "query": {
-                "script_score": {
-                    "query": {
-                        "bool": {
-                            "must": [{"match": {"content": query}}],
-                            "should": [
-                                {"match_phrase": {"content": phrase}}
-                                for phrase in query.split()
-                            ],
-                        }
-                    },
-                    "script": {
-                        "source": "cosineSimilarity(params.query_vector, 'content_vector') + 1.0",
-                        "params": {"query_vector": encode_query(query)},
-                    },
-                }
-            },
-            "size": top_k * 2,  # Retrieve more results for reranking
-        }
-    elif method == "keyword":
-        # Implement keyword search
-        pass
-    elif method == "bm25":
-        # Implement BM25 search (already done)
-        pass
-    elif method == "hybrid":
-        # Implement hybrid search
-        pass
-    else:
-        raise ValueError(f"Unknown retrieval method: {method}")
+    fields = source_fields(fields)
+    source = fields
+    if rerank and fields is not None:
+        source = sorted(set(fields) | set(SOURCE_FIELDS["scoring"]))
+    return query, fields, source
 
-    results = es.search(index=ES_INDEX_NAME, body=search_body)
-    documents = [hit["_source"] for hit in results["hits"]["hits"]]
 
-    for doc, hit in zip(documents, results["hits"]["hits"]):
-        doc["_score"] = hit["_score"]
+def finish_retrieval(query, hits, top_k, rerank, fields, source):
+    documents = hits_to_documents(hits)
 
     if rerank:
         documents = rerank_documents(query, documents, top_k=top_k)
     else:
         documents = documents[:top_k]
 
+    if fields is not None and source != fields:
+        documents = [select_fields(doc, fields) for doc in documents]
     return documents
 
 
-def index_files(directory):
-    logger.info(f"Starting indexing process for directory: {directory}")
-    indexed_count = 0
-    for root, dirs, files in os.walk(directory):
-        logger.info(f"Scanning directory: {root}")
-        logger.info(f"Found {len(files)} files")
-        for file in files:
-            logger.info(f"Processing file: {file}")
-            if file.endswith(".md"):
-                file_path = os.path.join(root, file)
-                document = read_markdown_file(file_path)
-                if document:
-                    doc_id = get_document_id(file_path)
-                    yield {"_index": ES_INDEX_NAME, "_id": doc_id, "_source": document}
-                    indexed_count += 1
-                    logger.info(f"Prepared document for indexing: {file_path}")
-                else:
-                    logger.warning(f"Failed to process document: {file_path}")
-            else:
-                logger.info(f"Skipping non-markdown file: {file}")
-    logger.info(f"Prepared {indexed_count} documents for indexing")
-    return indexed_count
-
-
-def count_nested_objects(actions):
-    nested_count = 0
-    for action in actions:
-        doc = action["_source"]
-        nested_count += len(doc.get("tables", []))
-        nested_count += len(doc.get("lists", []))
-    return nested_count
-
-
-# Delete existing index
-delete_index_if_exists(es, ES_INDEX_NAME)
-
-# Create index with mapping
-create_index_with_mapping()
-
-# Bulk index the documents
-try:
-    actions = list(index_files(data_directory))
-    logger.info(f"Total actions prepared for indexing: {len(actions)}")
-    if len(actions) == 0:
-        logger.warning(
-            "No documents prepared for indexing. Check the data directory and file processing."
-        )
-    nested_objects = count_nested_objects(actions)
-    logger.info(
-        f"Prepared {len(actions)} top-level documents and {nested_objects} nested objects"
+def retrieve_relevant_documents(
+    query,
+    method="semantic",
+    top_k=5,
+    rerank=True,
+    rewrite_query=True,
+    collapse_by_parent=False,
+    fields="context",
+    filters=None,
+    backend=RETRIEVAL_BACKEND,
+):
+    # fields selects the _source fields of the returned documents, see
+    # SOURCE_FIELDS. The reranker's fields are fetched while reranking and
+    # dropped again unless they were asked for. filters restricts results by
+    # category and/or type, e.g. {"type": ["spells"]}.
+    query, fields, source = prepare_retrieval(
+        query, method, rerank, rewrite_query, fields, backend
     )
-    success, failed = helpers.bulk(es, actions, stats_only=False, raise_on_error=False)
-    logger.info(f"Indexed {success} documents successfully.")
-    if failed:
-        logger.error(f"{len(failed)} documents failed to index:")
-        for item in failed:
-            logger.error(f"Error: {item['index']['error']}")
-            logger.error(f"Document: {json.dumps(item['index']['data'], indent=2)}")
-except Exception as e:
-    logger.error(f"An error occurred during bulk indexing: {e}")
-
-# Refresh the index
-try:
-    es.indices.refresh(index=ES_INDEX_NAME)
-    logger.info(f"Refreshed index: {ES_INDEX_NAME}")
-except Exception as e:
-    logger.error(f"Error refreshing index: {e}")
-
-# Print index stats
-try:
-    stats = es.indices.stats(index=ES_INDEX_NAME)
-    doc_count = stats["indices"][ES_INDEX_NAME]["total"]["docs"]["count"]
-    logger.info(f"Total documents in index: {doc_count}")
-
-    if doc_count != len(actions):
-        logger.warning(
-            f"Mismatch in document count. Expected: {len(actions)}, Actual: {doc_count}"
-        )
-
-    search_result = es.search(
-        index=ES_INDEX_NAME, body={"query": {"match_all": {}}, "size": 1}
+    size = top_k * 2  # Retrieve more results for reranking
+    hits = search_hits(
+        query, method, size, backend, collapse_by_parent, filters, source
+    )
+    return finish_retrieval(query, hits, top_k, rerank, fields, source)
+
+
+async def retrieve_relevant_documents_async(
+    query,
+    method="semantic",
+    top_k=5,
+    rerank=True,
+    rewrite_query=True,
+    collapse_by_parent=False,
+    fields="context",
+    filters=None,
+    backend=RETRIEVAL_BACKEND,
+):
+    # Same as retrieve_relevant_documents for the API: searches are awaited,
+    # query rewriting and reranking run on the bounded executor
+    query, fields, source = await run_blocking(
+        prepare_retrieval, query, method, rerank, rewrite_query, fields, backend
+    )
+    size = top_k * 2
+    hits = await search_hits_async(
+        query, method, size, backend, collapse_by_parent, filters, source
     )
-    logger.info(
-        f"Sample document: {json.dumps(search_result['hits']['hits'][0]['_source'], indent=2)}"
+    return await run_blocking(
+        finish_retrieval, query, hits, top_k, rerank, fields, source
     )
-except Exception as e:
-    logger.error(f"Error retrieving index stats: {e}")
 
-# Calculate total expected documents
-total_expected = len(actions) + nested_objects
-logger.info(f"Total expected documents (including nested): {total_expected}")
 
-logger.info("Indexing process completed.")
+def search_sources(search_body, index_name, fields):
+    fields = source_fields(fields)
+    if fields is not None:
+        search_body["_source"] = fields
+    results = get_es().search(index=index_name, body=search_body)
+    return [hit["_source"] for hit in results["hits"]["hits"]]
 
 
-def keyword_search(query, index_name=ES_INDEX_NAME, top_k=3):
-    search_body = {"query": {"match": {"content": query}}, "size": top_k}
-    results = es.search(index=index_name, body=search_body)
-    return [hit["_source"] for hit in results["hits"]["hits"]]
+def keyword_search(query, index_name=ES_INDEX_NAME, top_k=3, fields="context"):
+    return search_sources(keyword_query(query, top_k), index_name, fields)
 
 
-def bm25_search(query, index_name=ES_INDEX_NAME, top_k=3):
-    search_body = {
-        "query": {"match": {"content": {"query": query, "fuzziness": "AUTO"}}},
-        "size": top_k,
-    }
-    results = es.search(index=index_name, body=search_body)
-    return [hit["_source"] for hit in results["hits"]["hits"]]
+def bm25_search(query, index_name=ES_INDEX_NAME, top_k=3, fields="context"):
+    return search_sources(fuzzy_content_query(query, top_k), index_name, fields)
 
 
-def semantic_search(query, index_name=ES_INDEX_NAME, top_k=3):
+def semantic_search(query, index_name=ES_INDEX_NAME, top_k=3, fields="context"):
     try:
-        query_vector = model.encode(query).tolist()
-        search_body = {
-            "query": {
-                "script_score": {
-                    "query": {"match_all": {}},
-                    "script": {
-                        "source": "cosineSimilarity(params.query_vector, 'content_vector') + 1.0",
-                        "params": {"query_vector": query_vector},
-                    },
-                }
-            },
-            "size": top_k,
-        }
-        logger.info(f"Semantic search query: {search_body}")
-        results = es.search(index=index_name, body=search_body)
-        return [hit["_source"] for hit in results["hits"]["hits"]]
+        search_body = vector_query(encode_query(query), top_k)
+        logger.info(f"Semantic search on {index_name} (top {top_k})")
+        return search_sources(search_body, index_name, fields)
     except Exception as e:
         logger.error(f"Error in semantic search: {str(e)}")
         logger.info("Falling back to keyword search")
-        return keyword_search(query, index_name, top_k)
+        return keyword_search(query, index_name, top_k, fields)
 
 
-def hybrid_search(query, index_name=ES_INDEX_NAME, top_k=3, alpha=0.5):
+def hybrid_search(
+    query, index_name=ES_INDEX_NAME, top_k=3, alpha=0.5, fields="context"
+):
+    # alpha weights the vector side of the fusion, 1 - alpha the lexical side
     try:
-        query_vector = model.encode(query).tolist()
-        search_body = {
-            "query": {
-                "script_score": {
-                    "query": {
-                        "bool": {
-                            "should": [
-                                {"match": {"content": query}},
-                                {"match": {"title": query}},
-                            ]
-                        }
-                    },
-                    "script": {
-                        "source": f"cosineSimilarity(params.query_vector, 'content_vector') * {alpha} + _score * (1 - {alpha})",
-                        "params": {"query_vector": query_vector},
-                    },
-                }
-            },
-            "size": top_k,
-        }
-        logger.info(f"Hybrid search query: {search_body}")
-        results = es.search(index=index_name, body=search_body)
-        return [hit["_source"] for hit in results["hits"]["hits"]]
+        hits = hybrid_hits(
+            query,
+            top_k,
+            index_name,
+            lexical_weight=2 * (1 - alpha),
+            vector_weight=2 * alpha,
+            source=source_fields(fields),
+        )
+        return [hit["_source"] for hit in hits]
     except Exception as e:
         logger.error(f"Error in hybrid search: {str(e)}")
         logger.info("Falling back to keyword search")
-        return keyword_search(query, index_name, top_k)
+        return keyword_search(query, index_name, top_k, fields)
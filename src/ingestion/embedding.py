@@ -0,0 +1,106 @@
+import os
+import logging
+import time
+from src.models.embedding_cache import cached_encode, get_embedding_cache
+from src.models.model_registry import configure_torch_threads
+
+logger = logging.getLogger(__name__)
+
+# Number of documents per forward pass and number of torch CPU threads used
+# while embedding (0 keeps torch's default).
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+EMBED_THREADS = int(os.getenv("EMBED_THREADS", "0"))
+# Number of batches collected before length-sorting when embedding a stream
+EMBED_WINDOW_BATCHES = int(os.getenv("EMBED_WINDOW_BATCHES", "8"))
+
+
+def configure_threads(threads=EMBED_THREADS):
+    # Must run before the model is loaded to take precedence over MODEL_THREADS
+    configure_torch_threads(threads)
+
+
+def token_lengths(model, texts):
+    # Token counts are capped at the model's max sequence length because
+    # anything beyond it is truncated before the forward pass anyway.
+    max_length = getattr(model, "max_seq_length", None) or 512
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return [min(len(text.split()), max_length) for text in texts]
+    encoded = tokenizer(
+        texts, add_special_tokens=False, truncation=True, max_length=max_length
+    )
+    return [len(ids) for ids in encoded["input_ids"]]
+
+
+def length_sorted_batches(lengths, batch_size):
+    # Group indices of similar length so each batch pads to a similar size
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i], reverse=True)
+    for start in range(0, len(order), batch_size):
+        yield order[start : start + batch_size]
+
+
+def embed_texts(model, texts, batch_size=EMBED_BATCH_SIZE):
+    # Texts already in the embedding cache are not encoded again
+    return cached_encode(
+        model,
+        texts,
+        encode=lambda model, texts: encode_length_sorted(model, texts, batch_size),
+    )
+
+
+def encode_length_sorted(model, texts, batch_size=EMBED_BATCH_SIZE):
+    vectors = [None] * len(texts)
+    for batch in length_sorted_batches(token_lengths(model, texts), batch_size):
+        embeddings = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        for i, embedding in zip(batch, embeddings):
+            vectors[i] = embedding
+    return vectors
+
+
+def embed_documents(model, documents, batch_size=EMBED_BATCH_SIZE, field="content"):
+    if not documents:
+        return documents
+    start_time = time.time()
+    vectors = embed_texts(model, [doc[field] for doc in documents], batch_size)
+    for doc, vector in zip(documents, vectors):
+        doc["content_vector"] = vector.tolist()
+    elapsed = time.time() - start_time
+    logger.info(
+        f"Embedded {len(documents)} documents in {elapsed:.2f}s "
+        f"({len(documents) / elapsed if elapsed else 0:.1f} docs/s, batch size {batch_size})"
+    )
+    return documents
+
+
+def embed_document_stream(
+    model, documents, batch_size=EMBED_BATCH_SIZE, window_batches=EMBED_WINDOW_BATCHES
+):
+    # Embeds an iterable of (key, document) pairs window by window. Each window
+    # is length-sorted into batches and then yielded in its original order.
+    window_size = batch_size * window_batches
+    window = []
+    total = 0
+    start_time = time.time()
+    for item in documents:
+        window.append(item)
+        if len(window) >= window_size:
+            embed_documents(model, [doc for _, doc in window], batch_size)
+            total += len(window)
+            yield from window
+            window = []
+    if window:
+        embed_documents(model, [doc for _, doc in window], batch_size)
+        total += len(window)
+        yield from window
+    elapsed = time.time() - start_time
+    if total:
+        logger.info(
+            f"Embedding stage finished: {total} documents in {elapsed:.2f}s "
+            f"({total / elapsed if elapsed else 0:.1f} docs/s end to end)"
+        )
+        logger.info(f"Embedding cache: {get_embedding_cache().stats()}")
@@ -0,0 +1,472 @@
+import os
+import itertools
+import json
+import logging
+import time
+from elasticsearch import helpers
+from .elasticsearch_ingestion import (
+    ES_INDEX_NAME,
+    INDEX_LAYOUT,
+    data_directory,
+    get_es,
+    get_model,
+    get_document_id,
+    delete_index_if_exists,
+    create_index_with_mapping,
+    mark_index_updated,
+)
+from .markdown_parsing import PARSE_WORKERS, parse_documents
+from .embedding import EMBED_BATCH_SIZE, embed_document_stream
+from .bulk import bulk_index
+from .vector_store import (
+    VECTOR_STORE_DIR,
+    VECTOR_STORE_DTYPE,
+    VECTOR_STORE_QUANTIZATION,
+    write_vector_store,
+)
+from .bm25_index import build_bm25_index
+from .chunking import INGEST_CHUNKING
+from .manifest import (
+    MANIFEST_PATH,
+    new_manifest,
+    load_manifest,
+    save_manifest,
+    is_compatible,
+    scan_directory,
+    plan_changes,
+    pending_keys,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def list_markdown_files(directory):
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if file.endswith(".md"):
+                yield os.path.join(root, file)
+
+
+def get_indexed_ids(es, index_name=ES_INDEX_NAME):
+    # Map of parent document id (the file's content hash) -> file path for
+    # everything currently in the index
+    if not es.indices.exists(index=index_name):
+        return {}
+    indexed = {}
+    for hit in helpers.scan(
+        es,
+        index=index_name,
+        query={"query": {"match_all": {}}},
+        _source=["file_path", "parent_id"],
+    ):
+        parent_id = hit["_source"].get("parent_id", hit["_id"])
+        indexed[parent_id] = hit["_source"].get("file_path")
+    return indexed
+
+
+def report_bulk_errors(failed):
+    failed_ids = set()
+    if failed:
+        logger.error(f"{len(failed)} documents failed to index:")
+        for item in failed:
+            for op, details in item.items():
+                logger.error(f"Error ({op}): {details.get('error')}")
+                logger.error(f"Document id: {details.get('_id')}")
+                failed_ids.add(details.get("_id"))
+    return failed_ids
+
+
+def index_size(es, index_name=ES_INDEX_NAME):
+    # Primary store size and Lucene document count (nested objects included)
+    if not es.indices.exists(index=index_name):
+        return None
+    primaries = es.indices.stats(index=index_name)["indices"][index_name]["primaries"]
+    return {
+        "size_in_bytes": primaries["store"]["size_in_bytes"],
+        "lucene_docs": primaries["docs"]["count"],
+    }
+
+
+def log_index_size(label, size):
+    if size is None:
+        logger.info(f"Index size {label}: index does not exist")
+    else:
+        logger.info(
+            f"Index size {label}: {size['size_in_bytes'] / 1024 / 1024:.1f} MB, "
+            f"{size['lucene_docs']} Lucene documents"
+        )
+
+
+def new_stats():
+    return {
+        "prepared": 0,
+        "nested": 0,
+        "parse_errors": [],
+        "ids": set(),
+        "doc_ids": {},
+    }
+
+
+def build_index_actions(
+    entries,
+    keys,
+    stats,
+    batch_size=EMBED_BATCH_SIZE,
+    workers=PARSE_WORKERS,
+    chunking=INGEST_CHUNKING,
+    layout=INDEX_LAYOUT,
+):
+    # Streams files through the parse (process pool) and embedding (batched)
+    # stages and yields bulk actions in the order of keys.
+    def parsed_documents():
+        paths = [entries[key]["file_path"] for key in keys]
+        for key, (file_path, documents, error) in zip(
+            keys, parse_documents(paths, workers, chunking, layout)
+        ):
+            if error:
+                logger.error(f"Failed to process document {file_path}: {error}")
+                stats["parse_errors"].append((file_path, error))
+                continue
+            parent_id = entries[key]["hash"]
+            doc_ids = []
+            for document in documents:
+                # Whole-file documents use the content hash as id; section
+                # chunks append their position within the file.
+                if chunking == "sections":
+                    doc_id = f"{parent_id}-{document['chunk_index']}"
+                else:
+                    doc_id = parent_id
+                document["parent_id"] = parent_id
+                doc_ids.append(doc_id)
+                yield doc_id, document
+            stats["doc_ids"][key] = doc_ids
+
+    for doc_id, document in embed_document_stream(
+        get_model(), parsed_documents(), batch_size
+    ):
+        stats["prepared"] += 1
+        stats["nested"] += len(document.get("tables", []))
+        stats["nested"] += len(document.get("lists", []))
+        stats["ids"].add(doc_id)
+        yield {
+            "_op_type": "index",
+            "_index": ES_INDEX_NAME,
+            "_id": doc_id,
+            "_source": document,
+        }
+
+
+def record_indexed(manifest, entries, keys, stats, failed_ids):
+    # Only files whose documents all made it into the index are recorded, so
+    # anything that failed is picked up again by the next incremental run.
+    for key in keys:
+        doc_ids = stats["doc_ids"].get(key)
+        if doc_ids is None:
+            continue
+        if all(
+            doc_id in stats["ids"] and doc_id not in failed_ids for doc_id in doc_ids
+        ):
+            entries[key]["doc_ids"] = doc_ids
+            manifest["files"][key] = entries[key]
+
+
+def full_index(
+    directory=data_directory,
+    manifest_path=MANIFEST_PATH,
+    batch_size=EMBED_BATCH_SIZE,
+    workers=PARSE_WORKERS,
+    bulk_options=None,
+    chunking=INGEST_CHUNKING,
+    layout=INDEX_LAYOUT,
+):
+    es = get_es()
+    start_time = time.time()
+    size_before = index_size(es)
+    log_index_size("before", size_before)
+
+    # Delete existing index and recreate it with the mapping
+    delete_index_if_exists(es, ES_INDEX_NAME)
+    create_index_with_mapping(layout)
+
+    entries = scan_directory(directory)
+    keys = sorted(entries)
+    stats = new_stats()
+    actions = build_index_actions(
+        entries, keys, stats, batch_size, workers, chunking, layout
+    )
+
+    success, failed = bulk_index(es, actions, **(bulk_options or {}))
+    logger.info(
+        f"Prepared {stats['prepared']} top-level documents and "
+        f"{stats['nested']} nested objects"
+    )
+    if stats["prepared"] == 0:
+        logger.warning(
+            "No documents prepared for indexing. Check the data directory and file processing."
+        )
+    logger.info(f"Indexed {success} documents successfully.")
+    failed_ids = report_bulk_errors(failed)
+
+    es.indices.refresh(index=ES_INDEX_NAME)
+    logger.info(f"Refreshed index: {ES_INDEX_NAME}")
+    mark_index_updated(es)
+    size_after = index_size(es)
+    log_index_size("after", size_after)
+
+    manifest = new_manifest(ES_INDEX_NAME, chunking, layout)
+    record_indexed(manifest, entries, keys, stats, failed_ids)
+    save_manifest(manifest, manifest_path)
+
+    logger.info(f"Full indexing completed in {time.time() - start_time:.2f}s")
+    return {
+        "indexed": success,
+        "failed": len(failed) + len(stats["parse_errors"]),
+        "deleted": 0,
+        "size_before": size_before,
+        "size_after": size_after,
+    }
+
+
+def incremental_index(
+    directory=data_directory,
+    manifest_path=MANIFEST_PATH,
+    batch_size=EMBED_BATCH_SIZE,
+    workers=PARSE_WORKERS,
+    bulk_options=None,
+    chunking=INGEST_CHUNKING,
+    layout=INDEX_LAYOUT,
+):
+    es = get_es()
+    start_time = time.time()
+
+    manifest = load_manifest(manifest_path)
+    if not es.indices.exists(index=ES_INDEX_NAME):
+        logger.info(f"Index {ES_INDEX_NAME} does not exist, running a full index")
+        return full_index(
+            directory,
+            manifest_path,
+            batch_size,
+            workers,
+            bulk_options,
+            chunking,
+            layout,
+        )
+    if not is_compatible(manifest, ES_INDEX_NAME, chunking, layout):
+        logger.info("No compatible ingestion manifest found, running a full index")
+        return full_index(
+            directory,
+            manifest_path,
+            batch_size,
+            workers,
+            bulk_options,
+            chunking,
+            layout,
+        )
+
+    entries = scan_directory(directory, manifest)
+    changes = plan_changes(entries, manifest)
+    logger.info(
+        f"Incremental update: {len(changes['added'])} added, "
+        f"{len(changes['changed'])} changed, {len(changes['removed'])} removed, "
+        f"{changes['unchanged']} unchanged"
+    )
+
+    to_index = changes["added"] + changes["changed"]
+    # Document ids derive from content hashes, so a changed file gets new ids
+    # and the documents stored under its previous hash have to be deleted,
+    # unless another file on disk still has exactly that content.
+    live_hashes = {entry["hash"] for entry in entries.values()}
+    to_delete = sorted(
+        {
+            doc_id
+            for key in changes["changed"] + changes["removed"]
+            if manifest["files"][key]["hash"] not in live_hashes
+            for doc_id in manifest["files"][key].get(
+                "doc_ids", [manifest["files"][key]["hash"]]
+            )
+        }
+    )
+
+    stats = new_stats()
+    actions = itertools.chain(
+        build_index_actions(
+            entries, to_index, stats, batch_size, workers, chunking, layout
+        ),
+        (
+            {"_op_type": "delete", "_index": ES_INDEX_NAME, "_id": doc_id}
+            for doc_id in to_delete
+        ),
+    )
+
+    failed_ids = set()
+    failed = []
+    size_before = size_after = None
+    if to_index or to_delete:
+        size_before = index_size(es)
+        log_index_size("before", size_before)
+        _, failed = bulk_index(es, actions, **(bulk_options or {}))
+        # A delete for a document that is already gone is not an error
+        failed = [
+            item for item in failed if item.get("delete", {}).get("status") != 404
+        ]
+        failed_ids = report_bulk_errors(failed)
+        es.indices.refresh(index=ES_INDEX_NAME)
+        mark_index_updated(es)
+        size_after = index_size(es)
+        log_index_size("after", size_after)
+
+    for key in changes["removed"]:
+        del manifest["files"][key]
+    for key in changes["changed"]:
+        del manifest["files"][key]
+    record_indexed(manifest, entries, to_index, stats, failed_ids)
+    # Refresh size/mtime of files that were touched without changing content
+    touched = [
+        key
+        for key in entries
+        if key in manifest["files"] and manifest["files"][key] != entries[key]
+    ]
+    for key in touched:
+        manifest["files"][key] = entries[key]
+    if to_index or changes["removed"] or touched:
+        save_manifest(manifest, manifest_path)
+
+    logger.info(f"Incremental indexing completed in {time.time() - start_time:.2f}s")
+    return {
+        "indexed": stats["prepared"] - sum(1 for item in failed if "index" in item),
+        "failed": len(failed) + len(stats["parse_errors"]),
+        "deleted": len(to_delete),
+        "size_before": size_before,
+        "size_after": size_after,
+    }
+
+
+def entry_hash(entry):
+    return entry["hash"] if entry else None
+
+
+def watch_index(
+    directory=data_directory,
+    manifest_path=MANIFEST_PATH,
+    interval=2.0,
+    batch_size=EMBED_BATCH_SIZE,
+    workers=PARSE_WORKERS,
+    bulk_options=None,
+    chunking=INGEST_CHUNKING,
+    layout=INDEX_LAYOUT,
+):
+    # Poll the data directory and apply edits as they happen. Unchanged files
+    # are detected from size and mtime alone, so an idle poll only stats files.
+    def run():
+        incremental_index(
+            directory,
+            manifest_path,
+            batch_size,
+            workers,
+            bulk_options,
+            chunking,
+            layout,
+        )
+        # Whatever is still pending after a run failed to parse or index. It
+        # is left alone until its content changes, instead of being parsed
+        # again on every poll.
+        manifest = load_manifest(manifest_path)
+        if manifest is None:
+            return {}
+        entries = scan_directory(directory, manifest)
+        failed = {key: entries.get(key) for key in pending_keys(entries, manifest)}
+        if failed:
+            logger.warning(
+                f"{len(failed)} files failed to index, waiting for them to change: "
+                f"{sorted(failed)}"
+            )
+        return failed
+
+    logger.info(f"Watching {directory} for changes every {interval}s")
+    failed = run()
+    while True:
+        time.sleep(interval)
+        manifest = load_manifest(manifest_path)
+        if manifest is None:
+            failed = run()
+            continue
+        # Failed files are scanned like recorded ones, so they are not hashed
+        # again unless their size or mtime changes
+        known = {key: entry for key, entry in failed.items() if entry}
+        entries = scan_directory(directory, {"files": {**known, **manifest["files"]}})
+        if any(
+            key not in failed or entry_hash(entries.get(key)) != entry_hash(failed[key])
+            for key in pending_keys(entries, manifest)
+        ):
+            failed = run()
+
+
+def build_local_store(
+    directory=data_directory,
+    store_dir=VECTOR_STORE_DIR,
+    batch_size=EMBED_BATCH_SIZE,
+    workers=PARSE_WORKERS,
+    chunking=INGEST_CHUNKING,
+    dtype=VECTOR_STORE_DTYPE,
+    quantization=VECTOR_STORE_QUANTIZATION,
+):
+    # Builds the vector store and BM25 index of the "local" retrieval backend
+    # from the markdown files directly; Elasticsearch is not needed. Vectors
+    # come from the embedding cache for anything that has been indexed before.
+    start_time = time.time()
+    entries = scan_directory(directory)
+    keys = sorted(entries)
+    stats = new_stats()
+    actions = build_index_actions(entries, keys, stats, batch_size, workers, chunking)
+    documents = [(action["_id"], action["_source"]) for action in actions]
+    # Both stores share the row order, so lexical hits can use the vector
+    # store's metadata
+    build_bm25_index(documents).save(store_dir)
+    count = write_vector_store(documents, store_dir, dtype, quantization)
+    logger.info(f"Local store built in {time.time() - start_time:.2f}s")
+    return {"indexed": count, "failed": len(stats["parse_errors"]), "deleted": 0}
+
+
+def verify_index(directory=data_directory):
+    es = get_es()
+    if not es.indices.exists(index=ES_INDEX_NAME):
+        logger.error(f"Index {ES_INDEX_NAME} does not exist")
+        return {"ok": False, "missing": None, "stale": None, "doc_count": 0}
+
+    on_disk = {get_document_id(path): path for path in list_markdown_files(directory)}
+    indexed = get_indexed_ids(es)
+
+    missing = sorted(path for doc_id, path in on_disk.items() if doc_id not in indexed)
+    stale = sorted(str(indexed[doc_id]) for doc_id in indexed if doc_id not in on_disk)
+
+    stats = es.indices.stats(index=ES_INDEX_NAME)
+    doc_count = stats["indices"][ES_INDEX_NAME]["total"]["docs"]["count"]
+    logger.info(f"Files on disk: {len(on_disk)}, documents in index: {len(indexed)}")
+    logger.info(f"Total Lucene documents in index (including nested): {doc_count}")
+
+    for path in missing:
+        logger.warning(f"Not indexed: {path}")
+    for path in stale:
+        logger.warning(f"Stale document in index: {path}")
+
+    if indexed:
+        search_result = es.search(
+            index=ES_INDEX_NAME,
+            body={
+                "query": {"match_all": {}},
+                "size": 1,
+                "_source": {"excludes": ["content_vector"]},
+            },
+        )
+        logger.info(
+            f"Sample document: {json.dumps(search_result['hits']['hits'][0]['_source'], indent=2)}"
+        )
+
+    ok = not missing and not stale
+    logger.info("Index is up to date" if ok else "Index is out of date")
+    return {
+        "ok": ok,
+        "missing": missing,
+        "stale": stale,
+        "doc_count": doc_count,
+    }
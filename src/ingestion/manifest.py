@@ -0,0 +1,132 @@
+import os
+import json
+import logging
+import hashlib
+from datetime import datetime
+from src.utils.config import EMBEDDING_MODEL_NAME
+
+logger = logging.getLogger(__name__)
+
+# Where the ingestion job records what has been indexed
+MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "./data/ingestion_manifest.json")
+
+# Bump when the mapping or the document layout changes so that existing
+# manifests are treated as stale and the next run does a full rebuild.
+INDEX_VERSION = 4
+
+
+def new_manifest(index_name, chunking="document", layout="standard"):
+    return {
+        "index_name": index_name,
+        "index_version": INDEX_VERSION,
+        "model_name": EMBEDDING_MODEL_NAME,
+        "chunking": chunking,
+        "layout": layout,
+        "updated_at": None,
+        "files": {},
+    }
+
+
+def load_manifest(path=MANIFEST_PATH):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {path}: {e}")
+        return None
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    manifest["updated_at"] = datetime.now().isoformat()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write to a temporary file first so a crash never leaves a truncated manifest
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    logger.info(f"Saved manifest with {len(manifest['files'])} files to {path}")
+
+
+def is_compatible(manifest, index_name, chunking="document", layout="standard"):
+    return (
+        manifest is not None
+        and manifest.get("index_name") == index_name
+        and manifest.get("index_version") == INDEX_VERSION
+        and manifest.get("model_name") == EMBEDDING_MODEL_NAME
+        and manifest.get("chunking", "document") == chunking
+        and manifest.get("layout", "standard") == layout
+    )
+
+
+def hash_file(file_path):
+    with open(file_path, "rb") as file:
+        return hashlib.md5(file.read()).hexdigest()
+
+
+def scan_directory(directory, manifest=None):
+    # Returns {relative path: entry} for every markdown file under directory.
+    # Files whose size and mtime match the manifest keep their recorded hash
+    # instead of being read again.
+    known = manifest["files"] if manifest else {}
+    entries = {}
+    for root, dirs, files in os.walk(directory):
+        for file in files:
+            if not file.endswith(".md"):
+                continue
+            file_path = os.path.join(root, file)
+            key = os.path.relpath(file_path, directory)
+            stat = os.stat(file_path)
+            previous = known.get(key)
+            if (
+                previous
+                and previous["size"] == stat.st_size
+                and previous["mtime"] == stat.st_mtime
+            ):
+                file_hash = previous["hash"]
+            else:
+                file_hash = hash_file(file_path)
+            entries[key] = {
+                "file_path": file_path,
+                "hash": file_hash,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+                "model_name": EMBEDDING_MODEL_NAME,
+                "index_version": INDEX_VERSION,
+            }
+            # Ids of the documents (or chunks) indexed for this content
+            if previous and previous["hash"] == file_hash and "doc_ids" in previous:
+                entries[key]["doc_ids"] = previous["doc_ids"]
+    return entries
+
+
+def pending_keys(entries, manifest):
+    # Files whose manifest record does not match disk: new, edited, touched
+    # or removed since they were last indexed
+    known = manifest["files"]
+    return {
+        key
+        for key in entries.keys() | known.keys()
+        if entries.get(key) != known.get(key)
+    }
+
+
+def plan_changes(entries, manifest):
+    known = manifest["files"] if manifest else {}
+    added = sorted(key for key in entries if key not in known)
+    changed = sorted(
+        key
+        for key in entries
+        if key in known and entries[key]["hash"] != known[key]["hash"]
+    )
+    removed = sorted(key for key in known if key not in entries)
+    unchanged = len(entries) - len(added) - len(changed)
+    return {
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+        "unchanged": unchanged,
+    }
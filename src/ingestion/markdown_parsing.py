@@ -0,0 +1,223 @@
+import os
+import re
+import copy
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import markdown
+from bs4 import BeautifulSoup
+from .chunking import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    split_sections,
+    build_chunks,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of processes used to parse markdown files during ingestion
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+
+
+def get_category_subcategory(file_path):
+    parts = file_path.split(os.sep)
+    category = parts[-2] if len(parts) > 1 else "Uncategorized"
+    subcategory = os.path.splitext(parts[-1])[0]
+    return category, subcategory
+
+
+def extract_tags(content):
+    # Extract tags from content (e.g., based on headers or specific patterns)
+    tags = re.findall(r"#(\w+)", content)
+    return list(set(tags))
+
+
+def parse_tables(soup):
+    tables = []
+    for table in soup.find_all("table"):
+        title = table.find_previous(["h1", "h2", "h3", "h4", "h5", "h6"])
+        title = title.text if title else "Untitled Table"
+        content = str(table)
+        tables.append({"title": title, "content": content})
+    return tables
+
+
+def parse_lists(soup):
+    lists = []
+    for list_elem in soup.find_all(["ul", "ol"]):
+        title = list_elem.find_previous(["h1", "h2", "h3", "h4", "h5", "h6"])
+        title = title.text if title else "Untitled List"
+        items = [li.text for li in list_elem.find_all("li")]
+        lists.append({"title": title, "items": items})
+    return lists
+
+
+def parse_section_nested(elements):
+    # Tables and lists of one section, parsed from copies of its elements so
+    # the document's soup is left as it was
+    fragment = BeautifulSoup("", "html.parser")
+    for element in elements:
+        fragment.append(copy.copy(element))
+    return {"tables": parse_tables(fragment), "lists": parse_lists(fragment)}
+
+
+def determine_document_type(file_path):
+    folder_name = os.path.basename(os.path.dirname(file_path)).lower()
+    return folder_name.replace(" ", "_")
+
+
+def load_markdown(file_path):
+    # Parses a markdown file into a document without its embedding; vectors are
+    # added in batches by src.ingestion.embedding.embed_documents. The soup is
+    # returned as well so callers can split it further.
+    with open(file_path, "r", encoding="utf-8") as file:
+        content = file.read()
+
+    # Convert Markdown to HTML
+    html = markdown.markdown(content, extensions=["tables"])
+
+    # Parse HTML with BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+
+    # Extract title
+    title = soup.find(["h1", "h2", "h3"])
+    title = title.text if title else os.path.splitext(os.path.basename(file_path))[0]
+
+    # Remove title from content
+    if title:
+        title_tag = soup.find(["h1", "h2", "h3"])
+        title_tag.extract()
+
+    # Extract main content
+    main_content = soup.get_text(separator="\n", strip=True)
+
+    # Extract category, subcategory, and tags
+    category, subcategory = get_category_subcategory(file_path)
+    tags = extract_tags(content)
+
+    # Parse tables and lists
+    tables = parse_tables(soup)
+    lists = parse_lists(soup)
+
+    # Determine document type
+    doc_type = determine_document_type(file_path)
+
+    # Create document
+    document = {
+        "title": title,
+        "content": main_content,
+        "category": category,
+        "subcategory": subcategory,
+        "tags": tags,
+        "file_path": file_path,
+        "tables": tables,
+        "lists": lists,
+        "type": doc_type,  # Add the document type
+    }
+
+    return document, soup
+
+
+def markdown_to_document(file_path):
+    document, _ = load_markdown(file_path)
+    return document
+
+
+def markdown_to_chunks(
+    file_path, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS
+):
+    document, soup = load_markdown(file_path)
+    sections = [
+        (heading, text, parse_section_nested(elements))
+        for heading, text, elements in split_sections(soup)
+    ]
+    return build_chunks(document, sections, max_tokens, overlap)
+
+
+def parse_markdown_file(file_path):
+    logger.info(f"Reading markdown file: {file_path}")
+    try:
+        document = markdown_to_document(file_path)
+        logger.info(f"Successfully processed file: {file_path}")
+        return document
+    except Exception as e:
+        logger.error(f"Error processing file {file_path}: {str(e)}")
+        return None
+
+
+def table_to_text(table):
+    soup = BeautifulSoup(table["content"], "html.parser")
+    rows = [
+        " | ".join(cell.get_text(strip=True) for cell in row.find_all(["th", "td"]))
+        for row in soup.find_all("tr")
+    ]
+    return "\n".join([table["title"]] + rows)
+
+
+def list_to_text(lst):
+    return "\n".join([lst["title"]] + [f"- {item}" for item in lst["items"]])
+
+
+def flatten_nested(document):
+    # Lean index layout: tables and lists become plain text fields instead of
+    # nested documents with the table's raw HTML
+    tables = document.pop("tables", None)
+    lists = document.pop("lists", None)
+    if tables is not None:
+        document["tables_text"] = "\n\n".join(table_to_text(t) for t in tables)
+    if lists is not None:
+        document["lists_text"] = "\n\n".join(list_to_text(lst) for lst in lists)
+    return document
+
+
+def extract_terms(text):
+    # Sorted unique lowercase terms, stored at ingest so the reranker can look
+    # up query terms without scanning the content
+    return sorted(set(re.findall(r"\w+", text.lower())))
+
+
+def parse_file_worker(file_path, chunking="document", layout="standard"):
+    # Runs in a pool process; errors are returned rather than logged so the
+    # parent can report them against the file in order.
+    try:
+        if chunking == "sections":
+            documents = markdown_to_chunks(file_path)
+        else:
+            documents = [markdown_to_document(file_path)]
+        for document in documents:
+            document["content_terms"] = extract_terms(document["content"])
+            if layout == "lean":
+                flatten_nested(document)
+        return file_path, documents, None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+
+def parse_documents(
+    file_paths, workers=PARSE_WORKERS, chunking="document", layout="standard"
+):
+    # Yields (file_path, documents, error) in the same order as file_paths,
+    # where documents holds one document per file or its section chunks.
+    # At most a few files per worker are in flight, so parsed documents are
+    # streamed to the next stage instead of piling up in memory.
+    file_paths = list(file_paths)
+    workers = max(1, min(workers, len(file_paths)))
+    if workers == 1:
+        for file_path in file_paths:
+            yield parse_file_worker(file_path, chunking, layout)
+        return
+
+    logger.info(f"Parsing {len(file_paths)} files with {workers} worker processes")
+    # "spawn" keeps the workers free of the parent's torch/tokenizer state
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        pending = deque()
+        for file_path in file_paths:
+            pending.append(
+                executor.submit(parse_file_worker, file_path, chunking, layout)
+            )
+            if len(pending) >= workers * 4:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
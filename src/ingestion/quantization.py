@@ -0,0 +1,54 @@
+import numpy as np
+
+# "int8" stores one byte per dimension (4x smaller than float32), "binary" one
+# bit per dimension (32x smaller). Both are only used for a coarse first pass;
+# the shortlist is rescored with the full-precision vectors.
+QUANTIZATION_METHODS = ("none", "int8", "binary")
+
+# Percentiles used as the int8 range so a few outliers do not stretch the
+# scale for every other value
+INT8_CLIP_PERCENTILES = (0.5, 99.5)
+
+# Number of set bits for every byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def calibrate(vectors, method):
+    # Per-dimension parameters computed from the (normalized) corpus vectors
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if method == "int8":
+        low, high = np.percentile(vectors, INT8_CLIP_PERCENTILES, axis=0)
+        high = np.maximum(high, low + 1e-6)
+        return {"method": "int8", "low": low.tolist(), "high": high.tolist()}
+    if method == "binary":
+        # Thresholding at the mean instead of zero keeps bits balanced
+        return {"method": "binary", "threshold": vectors.mean(axis=0).tolist()}
+    raise ValueError(f"Unknown quantization method: {method}")
+
+
+def quantize(vectors, calibration):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if calibration["method"] == "int8":
+        low = np.asarray(calibration["low"], dtype=np.float32)
+        high = np.asarray(calibration["high"], dtype=np.float32)
+        scaled = (np.clip(vectors, low, high) - low) / (high - low) * 255 - 128
+        return np.round(scaled).astype(np.int8)
+    threshold = np.asarray(calibration["threshold"], dtype=np.float32)
+    return np.packbits(vectors > threshold, axis=-1)
+
+
+def coarse_scores(codes, query, calibration):
+    # Approximate similarity of query to every row of codes; higher is better
+    query = np.asarray(query, dtype=np.float32)
+    if calibration["method"] == "int8":
+        # dot(query, low + (code + 128) * step) split into a constant and one
+        # matmul over the codes
+        low = np.asarray(calibration["low"], dtype=np.float32)
+        step = (np.asarray(calibration["high"], dtype=np.float32) - low) / 255
+        weights = query * step
+        offset = float(query @ low) + 128 * float(weights.sum())
+        return np.asarray(codes, dtype=np.float32) @ weights + offset
+    # Negative Hamming distance between the packed bit codes
+    query_bits = quantize(query[None, :], calibration)[0]
+    distances = POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1, dtype=np.int32)
+    return -distances.astype(np.float32)
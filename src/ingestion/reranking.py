@@ -1,50 +1,74 @@
-import re
-from sentence_transformers import SentenceTransformer, util
-import torch
 import logging
+from bisect import bisect_left
+import numpy as np
+from src.models.embedding_cache import cached_encode, embed_query
+from src.models.model_registry import get_sentence_transformer
+from .markdown_parsing import extract_terms
 
 logger = logging.getLogger(__name__)
 
-# Initialize the model
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# Adjust weights here: semantic, keyword, initial score, content length
+RERANK_WEIGHTS = np.array([0.4, 0.3, 0.2, 0.1], dtype=np.float32)
 
 
-def rerank_documents(query, documents, top_k=5):
-    if not documents:
-        return []
-
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    doc_embeddings = model.encode(
-        [doc["content"] for doc in documents], convert_to_tensor=True
-    )
+def document_vectors(documents):
+    # Uses the content_vector stored in the index and only falls back to the
+    # (cached) model for documents that come back without one, e.g. from an
+    # index with the lean layout.
+    vectors = [doc.get("content_vector") for doc in documents]
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        logger.info(f"Looking up {len(missing)} vectors in the embedding cache")
+        encoded = cached_encode(
+            get_sentence_transformer(), [documents[i]["content"] for i in missing]
+        )
+        for i, vector in zip(missing, encoded):
+            vectors[i] = vector
+    return np.asarray(vectors, dtype=np.float32)
 
-    cos_scores = util.pytorch_cos_sim(query_embedding, doc_embeddings)[0]
-    cos_scores = cos_scores.cpu().tolist()
 
-    query_terms = set(re.findall(r"\w+", query.lower()))
+def count_matching_terms(query_terms, doc_terms):
+    # doc_terms is sorted, so each query term is a binary search
+    count = 0
+    for term in query_terms:
+        i = bisect_left(doc_terms, term)
+        if i < len(doc_terms) and doc_terms[i] == term:
+            count += 1
+    return count
 
-    reranked_docs = []
-    for i, doc in enumerate(documents):
-        doc_terms = set(re.findall(r"\w+", doc["content"].lower()))
 
-        semantic_score = cos_scores[i]
-        keyword_score = len(query_terms.intersection(doc_terms)) / len(query_terms)
-        initial_score = doc["_score"]
-        content_length = len(doc["content"])
+def rerank_documents(query, documents, top_k=5):
+    if not documents:
+        return []
 
-        # Adjust weights here
-        combined_score = (
-            0.4 * semantic_score
-            + 0.3 * keyword_score
-            + 0.2 * initial_score
-            + 0.1
-            * min(1.0, content_length / 1000)  # Favor longer content, up to 1000 chars
-        )
+    query_vector = embed_query(query)
+    doc_vectors = document_vectors(documents)
+    norms = np.linalg.norm(doc_vectors, axis=1) * np.linalg.norm(query_vector)
+    semantic_scores = doc_vectors @ query_vector / np.maximum(norms, 1e-12)
 
-        reranked_docs.append((doc, combined_score))
+    query_terms = extract_terms(query)
+    keyword_scores = np.array(
+        [
+            count_matching_terms(
+                query_terms,
+                doc.get("content_terms") or extract_terms(doc["content"]),
+            )
+            for doc in documents
+        ],
+        dtype=np.float32,
+    ) / max(len(query_terms), 1)
+    initial_scores = np.array([doc["_score"] for doc in documents], dtype=np.float32)
+    # Favor longer content, up to 1000 chars
+    length_scores = np.minimum(
+        1.0, np.array([len(doc["content"]) for doc in documents]) / 1000
+    )
 
-    reranked_docs.sort(key=lambda x: x[1], reverse=True)
+    features = np.column_stack(
+        [semantic_scores, keyword_scores, initial_scores, length_scores]
+    )
+    combined_scores = features @ RERANK_WEIGHTS
+    order = np.argsort(-combined_scores, kind="stable")[:top_k]
 
-    logger.info(f"Reranking scores: {[score for _, score in reranked_docs[:top_k]]}")
+    logger.info(f"Reranking scores: {combined_scores[order].tolist()}")
 
-    return [doc for doc, _ in reranked_docs[:top_k]]
+    return [documents[i] for i in order]
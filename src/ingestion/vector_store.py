@@ -0,0 +1,261 @@
+import os
+import json
+import logging
+import threading
+import time
+import numpy as np
+from src.utils.config import EMBEDDING_MODEL_NAME
+from .quantization import calibrate, quantize, coarse_scores
+
+logger = logging.getLogger(__name__)
+
+# Local vector store used by the "local" retrieval backend
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "./data/vector_store")
+# float16 halves the size of the matrix at a small cost in precision
+VECTOR_STORE_DTYPE = os.getenv("VECTOR_STORE_DTYPE", "float32")
+# Rows scored per matmul; float16 blocks are converted to float32 for BLAS
+VECTOR_STORE_BLOCK_ROWS = int(os.getenv("VECTOR_STORE_BLOCK_ROWS", "65536"))
+# Quantized codes ("int8" or "binary") for a coarse first pass, whose
+# top_k * VECTOR_STORE_RESCORE_FACTOR candidates are rescored exactly
+VECTOR_STORE_QUANTIZATION = os.getenv("VECTOR_STORE_QUANTIZATION", "none")
+VECTOR_STORE_RESCORE_FACTOR = int(os.getenv("VECTOR_STORE_RESCORE_FACTOR", "4"))
+
+# Metadata kept next to the vectors; tables and lists stay in the parsed files
+STORED_FIELDS = [
+    "title",
+    "content",
+    "category",
+    "subcategory",
+    "tags",
+    "file_path",
+    "type",
+    "parent_id",
+    "section",
+    "chunk_index",
+    "content_terms",
+]
+FILTER_FIELDS = ["category", "type"]
+
+
+def normalize_rows(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_rows(scores, top_k, mask=None):
+    # Rows of the top_k highest scores, best first
+    if mask is not None:
+        scores = np.where(mask, scores, -np.inf)
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    rows = np.argpartition(-scores, top_k - 1)[:top_k]
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+    return rows[np.isfinite(scores[rows])]
+
+
+def write_vector_store(
+    documents,
+    directory=VECTOR_STORE_DIR,
+    dtype=VECTOR_STORE_DTYPE,
+    quantization=VECTOR_STORE_QUANTIZATION,
+):
+    # documents is an iterable of (doc_id, source) pairs where source carries a
+    # content_vector. Files are written next to the live ones and swapped in
+    # at the end, with meta.json last, so readers never see a partial store.
+    os.makedirs(directory, exist_ok=True)
+    ids = []
+    metadata = []
+    vectors = []
+    for doc_id, source in documents:
+        ids.append(doc_id)
+        metadata.append(
+            {field: source[field] for field in STORED_FIELDS if field in source}
+        )
+        vectors.append(source["content_vector"])
+    matrix = (
+        normalize_rows(vectors).astype(dtype) if vectors else np.zeros((0, 0), dtype)
+    )
+
+    paths = {
+        "vectors": os.path.join(directory, "vectors.npy"),
+        "documents": os.path.join(directory, "documents.json"),
+        "meta": os.path.join(directory, "meta.json"),
+    }
+    code_bytes = 0
+    if quantization != "none" and len(ids):
+        calibration = calibrate(matrix, quantization)
+        codes = quantize(matrix, calibration)
+        code_bytes = codes.nbytes
+        codes_path = os.path.join(directory, "codes.npy")
+        calibration_path = os.path.join(directory, "calibration.json")
+        np.save(f"{codes_path}.tmp.npy", codes)
+        with open(f"{calibration_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(calibration, f)
+        os.replace(f"{codes_path}.tmp.npy", codes_path)
+        os.replace(f"{calibration_path}.tmp", calibration_path)
+    else:
+        quantization = "none"
+    np.save(f"{paths['vectors']}.tmp.npy", matrix)
+    with open(f"{paths['documents']}.tmp", "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": metadata}, f)
+    with open(f"{paths['meta']}.tmp", "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "model_name": EMBEDDING_MODEL_NAME,
+                "count": len(ids),
+                "dim": int(matrix.shape[1]) if len(ids) else 0,
+                "dtype": dtype,
+                "quantization": quantization,
+                "built_at": time.time(),
+            },
+            f,
+        )
+    os.replace(f"{paths['vectors']}.tmp.npy", paths["vectors"])
+    os.replace(f"{paths['documents']}.tmp", paths["documents"])
+    os.replace(f"{paths['meta']}.tmp", paths["meta"])
+    logger.info(
+        f"Wrote local vector store with {len(ids)} vectors ({dtype}, "
+        f"{matrix.nbytes / 1024 / 1024:.1f} MB) to {directory}"
+    )
+    if code_bytes:
+        logger.info(
+            f"{quantization} codes: {code_bytes / 1024 / 1024:.2f} MB "
+            f"({matrix.nbytes / code_bytes:.0f}x smaller than the vectors)"
+        )
+    return len(ids)
+
+
+class VectorStore:
+    def __init__(self, directory=VECTOR_STORE_DIR):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        with open(
+            os.path.join(directory, "documents.json"), "r", encoding="utf-8"
+        ) as f:
+            stored = json.load(f)
+        self.ids = stored["ids"]
+        self.documents = stored["documents"]
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.quantization = self.meta.get("quantization", "none")
+        self.codes = None
+        self.calibration = None
+        if self.quantization != "none":
+            self.codes = np.load(os.path.join(directory, "codes.npy"), mmap_mode="r")
+            with open(
+                os.path.join(directory, "calibration.json"), "r", encoding="utf-8"
+            ) as f:
+                self.calibration = json.load(f)
+        # Filter columns as arrays so a filter is a single vectorized mask
+        self.columns = {
+            field: np.array([doc.get(field) for doc in self.documents], dtype=object)
+            for field in FILTER_FIELDS
+        }
+        if self.meta["model_name"] != EMBEDDING_MODEL_NAME:
+            logger.warning(
+                f"Vector store was built with {self.meta['model_name']}, "
+                f"queries are encoded with {EMBEDDING_MODEL_NAME}"
+            )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def filter_mask(self, filters):
+        mask = np.ones(len(self), dtype=bool)
+        for field, values in (filters or {}).items():
+            if field not in self.columns:
+                raise ValueError(
+                    f"Cannot filter on {field}, use one of {FILTER_FIELDS}"
+                )
+            values = [values] if isinstance(values, str) else list(values)
+            mask &= np.isin(self.columns[field], values)
+        return mask
+
+    def blocked(self, matrix, score):
+        # Applies score() to blocks of rows so float16 and int8 rows are
+        # converted to float32 one block at a time
+        result = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), VECTOR_STORE_BLOCK_ROWS):
+            block = matrix[start : start + VECTOR_STORE_BLOCK_ROWS]
+            result[start : start + len(block)] = score(block)
+        return result
+
+    def scores(self, query_vector):
+        query = normalize_rows(query_vector)
+        return self.blocked(
+            self.vectors, lambda block: np.asarray(block, dtype=np.float32) @ query
+        )
+
+    def search(
+        self,
+        query_vector,
+        top_k=10,
+        filters=None,
+        quantization=None,
+        rescore_factor=VECTOR_STORE_RESCORE_FACTOR,
+    ):
+        # Returns [(row, cosine similarity)] best first. quantization="none"
+        # forces an exact search on a quantized store.
+        quantization = quantization or self.quantization
+        if not len(self) or top_k <= 0:
+            return []
+        mask = self.filter_mask(filters) if filters else None
+        query = normalize_rows(query_vector)
+        if quantization == "none":
+            scores = self.scores(query)
+            return [
+                (int(row), float(scores[row])) for row in top_rows(scores, top_k, mask)
+            ]
+        if quantization != self.quantization:
+            raise ValueError(
+                f"Vector store has {self.quantization} codes, not {quantization}"
+            )
+
+        coarse = self.blocked(
+            self.codes, lambda block: coarse_scores(block, query, self.calibration)
+        )
+        shortlist = np.sort(top_rows(coarse, top_k * rescore_factor, mask))
+        exact = np.asarray(self.vectors[shortlist], dtype=np.float32) @ query
+        best = top_rows(exact, top_k)
+        return [(int(shortlist[i]), float(exact[i])) for i in best]
+
+    def source(self, row, fields=None):
+        doc = self.documents[row]
+        if fields is not None:
+            doc = {key: value for key, value in doc.items() if key in fields}
+        else:
+            doc = dict(doc)
+        if fields is None or "content_vector" in fields:
+            doc["content_vector"] = np.asarray(
+                self.vectors[row], dtype=np.float32
+            ).tolist()
+        return doc
+
+
+_store = None
+_store_built_at = None
+_store_lock = threading.Lock()
+
+
+def get_vector_store(directory=VECTOR_STORE_DIR):
+    # Reloads the store when it has been rebuilt since it was last opened
+    global _store, _store_built_at
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        raise FileNotFoundError(
+            f"No local vector store in {directory}, build it with "
+            "`python -m src.ingestion index local`"
+        )
+    with _store_lock:
+        built_at = os.path.getmtime(meta_path)
+        if (
+            _store is None
+            or _store.directory != directory
+            or built_at != _store_built_at
+        ):
+            _store = VectorStore(directory)
+            _store_built_at = built_at
+            logger.info(f"Loaded local vector store with {len(_store)} vectors")
+        return _store
@@ -0,0 +1,256 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from src.utils.config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    QUERY_CACHE_MAX_ITEMS,
+    QUERY_CACHE_TTL,
+)
+from src.utils.ttl_cache import TTLCache
+from src.models.model_registry import get_sentence_transformer
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text):
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def text_key(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+# Content-addressed embedding cache for one model. Vectors are appended as
+# float32 rows to <model>.vectors and read back through a memory map, and
+# <model>.index holds the SHA-256 of the normalized text for each row. Writes
+# are serialized with a file lock so the ingestion job and API workers can
+# share one cache directory. Recently used vectors are kept in an in-memory
+# LRU in front of the memory map.
+class EmbeddingCache:
+    def __init__(
+        self,
+        model_name=EMBEDDING_MODEL_NAME,
+        directory=EMBEDDING_CACHE_DIR,
+        memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+    ):
+        self.model_name = model_name
+        self.directory = directory
+        self.memory_items = memory_items
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.vectors_path = os.path.join(directory, f"{slug}.vectors")
+        self.index_path = os.path.join(directory, f"{slug}.index")
+        self.meta_path = os.path.join(directory, f"{slug}.meta.json")
+        self.lock_path = os.path.join(directory, f"{slug}.lock")
+        self.dim = None
+        self.rows = {}
+        self.row_count = 0
+        self.index_offset = 0
+        self.matrix = None
+        self.memory = OrderedDict()
+        self.lock = threading.RLock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        # Picks up rows appended by other processes since the last refresh
+        with self.lock:
+            if self.dim is None and os.path.exists(self.meta_path):
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    self.dim = json.load(f)["dim"]
+            if self.dim is None or not os.path.exists(self.index_path):
+                return
+            if os.path.getsize(self.index_path) == self.index_offset:
+                return
+            with open(self.index_path, "r", encoding="ascii") as f:
+                f.seek(self.index_offset)
+                for line in f:
+                    if not line.endswith("\n"):
+                        break
+                    self.rows.setdefault(line.strip(), self.row_count)
+                    self.row_count += 1
+                    self.index_offset += len(line)
+            available = os.path.getsize(self.vectors_path) // (4 * self.dim)
+            count = min(self.row_count, available)
+            self.matrix = (
+                np.memmap(
+                    self.vectors_path,
+                    dtype=np.float32,
+                    mode="r",
+                    shape=(count, self.dim),
+                )
+                if count
+                else None
+            )
+
+    def remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_items:
+            self.memory.popitem(last=False)
+
+    def lookup(self, key):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return vector
+            row = self.rows.get(key)
+            if row is None or self.matrix is None or row >= len(self.matrix):
+                return None
+            vector = np.array(self.matrix[row])
+            self.remember(key, vector)
+            self.hits += 1
+            self.disk_hits += 1
+            return vector
+
+    def get_many(self, keys):
+        vectors = [self.lookup(key) for key in keys]
+        if any(vector is None for vector in vectors):
+            self.refresh()
+            vectors = [
+                vector if vector is not None else self.lookup(key)
+                for key, vector in zip(keys, vectors)
+            ]
+        with self.lock:
+            self.misses += sum(1 for vector in vectors if vector is None)
+        return vectors
+
+    def put_many(self, keys, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if not len(vectors):
+            return
+        with self.lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+            for key, vector in zip(keys, vectors):
+                self.remember(key, vector)
+            with open(self.lock_path, "a") as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self.refresh()
+                    new = {}
+                    for key, vector in zip(keys, vectors):
+                        if key not in self.rows and key not in new:
+                            new[key] = vector
+                    if new:
+                        # Vectors are written before their index lines so an
+                        # index entry never points past the end of the data.
+                        with open(self.vectors_path, "ab") as f:
+                            f.write(np.stack(list(new.values())).tobytes())
+                        with open(self.index_path, "a", encoding="ascii") as f:
+                            f.write("".join(f"{key}\n" for key in new))
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self.refresh()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "model_name": self.model_name,
+                "entries": len(self.rows),
+                "memory_entries": len(self.memory),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name=EMBEDDING_MODEL_NAME):
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+        return _caches[model_name]
+
+
+def cached_encode(
+    model, texts, model_name=EMBEDDING_MODEL_NAME, encode=None, batch_size=32
+):
+    # Drop-in replacement for model.encode(texts) that returns float32 numpy
+    # vectors and only runs the model on texts missing from the cache. A custom
+    # encode(model, texts) can be supplied, e.g. for length-sorted batching.
+    single = isinstance(texts, str)
+    texts = [texts] if single else list(texts)
+    if encode is None:
+
+        def encode(model, texts):
+            return model.encode(
+                texts,
+                batch_size=batch_size,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+
+    if not EMBEDDING_CACHE_ENABLED:
+        vectors = np.asarray(encode(model, texts), dtype=np.float32)
+        return vectors[0] if single else vectors
+
+    cache = get_embedding_cache(model_name)
+    keys = [text_key(text) for text in texts]
+    vectors = cache.get_many(keys)
+
+    missing = {}
+    for i, (key, vector) in enumerate(zip(keys, vectors)):
+        if vector is None:
+            missing.setdefault(key, []).append(i)
+    if missing:
+        positions = [indices[0] for indices in missing.values()]
+        encoded = np.asarray(
+            encode(model, [texts[i] for i in positions]), dtype=np.float32
+        )
+        cache.put_many(list(missing), encoded)
+        for indices, vector in zip(missing.values(), encoded):
+            for i in indices:
+                vectors[i] = vector
+
+    result = np.stack(vectors) if vectors else np.zeros((0, cache.dim or 0))
+    return result[0] if single else result
+
+
+# Query embeddings are short-lived and kept in memory only, so user questions
+# do not end up in the on-disk document cache
+query_cache = TTLCache(QUERY_CACHE_MAX_ITEMS, QUERY_CACHE_TTL)
+
+
+def embed_query(query, model=None, model_name=EMBEDDING_MODEL_NAME):
+    # Every query-encoding call site goes through here, so a question that is
+    # searched, reranked and evaluated is only embedded once
+    key = (model_name, normalize_text(query))
+    vector = query_cache.get(key)
+    if vector is None:
+        model = model or get_sentence_transformer(model_name)
+        vector = np.asarray(
+            model.encode([query], convert_to_numpy=True, show_progress_bar=False)[0],
+            dtype=np.float32,
+        )
+        # Shared between callers, so it must not be modified in place
+        vector.setflags(write=False)
+        query_cache.put(key, vector)
+    return vector
@@ -0,0 +1,92 @@
+import os
+import time
+import logging
+import resource
+import threading
+from src.utils.config import EMBEDDING_MODEL_NAME, MODEL_DEVICE, MODEL_THREADS
+
+logger = logging.getLogger(__name__)
+
+# One instance per (kind, model name) for the whole process. Models are loaded
+# on first use, and concurrent first calls wait for a single load instead of
+# each loading their own copy.
+_models = {}
+_load_stats = {}
+_load_locks = {}
+_registry_lock = threading.Lock()
+_threads_configured = False
+
+
+def current_rss_mb():
+    # Resident set size of this process; falls back to the peak RSS where
+    # /proc is not available.
+    try:
+        with open("/proc/self/statm", "r") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def configure_torch_threads(threads=MODEL_THREADS):
+    global _threads_configured
+    if _threads_configured or not threads or threads <= 0:
+        return
+    import torch
+
+    torch.set_num_threads(threads)
+    _threads_configured = True
+    logger.info(f"Using {threads} torch threads for model inference")
+
+
+def load_sentence_transformer(model_name):
+    from sentence_transformers import SentenceTransformer
+
+    configure_torch_threads()
+    return SentenceTransformer(model_name, device=MODEL_DEVICE or None)
+
+
+LOADERS = {
+    "sentence_transformer": load_sentence_transformer,
+}
+
+
+def get_model(kind, model_name):
+    key = (kind, model_name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _registry_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+    with load_lock:
+        if key in _models:
+            return _models[key]
+        rss_before = current_rss_mb()
+        start_time = time.time()
+        model = LOADERS[kind](model_name)
+        load_seconds = time.time() - start_time
+        rss_delta = current_rss_mb() - rss_before
+        _load_stats[key] = {
+            "kind": kind,
+            "model_name": model_name,
+            "device": str(getattr(model, "device", "cpu")),
+            "load_seconds": round(load_seconds, 3),
+            "rss_delta_mb": round(rss_delta, 1),
+        }
+        logger.info(
+            f"Loaded {kind} {model_name} in {load_seconds:.2f}s "
+            f"(+{rss_delta:.0f} MB resident)"
+        )
+        _models[key] = model
+        return model
+
+
+def get_sentence_transformer(model_name=EMBEDDING_MODEL_NAME):
+    return get_model("sentence_transformer", model_name)
+
+
+def model_stats():
+    return {
+        "process_rss_mb": round(current_rss_mb(), 1),
+        "models": list(_load_stats.values()),
+    }
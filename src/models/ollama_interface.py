@@ -1,5 +1,15 @@
-import requests
 import os
+import json
+import math
+import time
+import heapq
+import asyncio
+import weakref
+import itertools
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+import httpx
 from dotenv import load_dotenv
 import logging
 
@@ -10,26 +20,213 @@ load_dotenv()
 OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434/api/generate")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral:latest")
 
+# Connection pool shared by all generations: at most OLLAMA_POOL_SIZE open
+# connections, kept alive for OLLAMA_KEEPALIVE_EXPIRY seconds between requests
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+OLLAMA_KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "60"))
+# Timeouts in seconds; the read timeout bounds the wait for a full answer
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "240"))
+OLLAMA_POOL_TIMEOUT = float(os.getenv("OLLAMA_POOL_TIMEOUT", "30"))
 
-def query_ollama(prompt, context):
-    data = {
-        "model": OLLAMA_MODEL,
-        "prompt": prompt,
-        "context": context,
-        "stream": False,
+# Generations allowed to run at once, and how many more may wait for a slot
+# (and for how long, in seconds) before requests are turned away
+OLLAMA_MAX_CONCURRENCY = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "1"))
+OLLAMA_QUEUE_MAX_DEPTH = int(os.getenv("OLLAMA_QUEUE_MAX_DEPTH", "16"))
+OLLAMA_QUEUE_MAX_WAIT = float(os.getenv("OLLAMA_QUEUE_MAX_WAIT", "120"))
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+ERROR_ANSWER = "I'm sorry, but I encountered an error while processing your request."
+
+
+def client_options():
+    return {
+        "limits": httpx.Limits(
+            max_connections=OLLAMA_POOL_SIZE,
+            max_keepalive_connections=OLLAMA_POOL_SIZE,
+            keepalive_expiry=OLLAMA_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(
+            connect=OLLAMA_CONNECT_TIMEOUT,
+            read=OLLAMA_READ_TIMEOUT,
+            write=OLLAMA_CONNECT_TIMEOUT,
+            pool=OLLAMA_POOL_TIMEOUT,
+        ),
     }
 
-    try:
-        response = requests.post(OLLAMA_URL, json=data)
-        response.raise_for_status()
-        return response.json()["response"]
-    except requests.exceptions.RequestException as e:
-        print(f"Error querying Ollama: {e}")
-        return None
 
+# One async client per event loop (connections cannot move between loops),
+# and one blocking client for scripts and other synchronous callers
+_async_clients = weakref.WeakKeyDictionary()
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(**client_options())
+        _async_clients[loop] = client
+    return client
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(**client_options())
+        return _client
+
+
+async def close_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
 
-def rag_query(question, context, max_tokens=300):
-    prompt = f"""Given the following context, answer the question. If the answer is not in the context, say "I don't have enough information to answer that question."
+
+class SchedulerBusy(Exception):
+    # Raised when the generation queue is full or a request waited too long;
+    # retry_after is a suggested number of seconds before trying again
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class GenerationError(Exception):
+    # Raised when a streamed generation reports an error or ends before its
+    # final "done" chunk
+    pass
+
+
+# Admission control for generations in this process. At most max_concurrency
+# generations run at once; the rest wait in a priority queue (interactive
+# before batch, then first come first served) of at most max_depth entries
+# for at most max_wait seconds. Requests beyond that fail fast with
+# SchedulerBusy instead of piling up behind a busy model.
+class GenerationScheduler:
+    def __init__(
+        self,
+        max_concurrency=OLLAMA_MAX_CONCURRENCY,
+        max_depth=OLLAMA_QUEUE_MAX_DEPTH,
+        max_wait=OLLAMA_QUEUE_MAX_WAIT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self.active = 0
+        # Heap of (priority, sequence, future, priority name)
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_times = deque(maxlen=1000)
+        # Moving average of the time a generation holds its slot
+        self.average_duration = None
+
+    def queued(self):
+        return [entry for entry in self.waiting if not entry[2].done()]
+
+    def retry_after(self):
+        # Roughly the time until the current queue has drained
+        duration = self.average_duration or 10.0
+        rounds = (len(self.queued()) + 1) / self.max_concurrency
+        return max(1, math.ceil(duration * rounds))
+
+    def check_admission(self):
+        # Fails fast when a new request would be rejected, e.g. before a
+        # streaming response has been started
+        if len(self.queued()) >= self.max_depth:
+            self.rejected += 1
+            raise SchedulerBusy("Generation queue is full", self.retry_after())
+
+    async def acquire(self, priority="interactive"):
+        if priority not in PRIORITIES:
+            raise ValueError(
+                f"Unknown priority {priority}, use one of {list(PRIORITIES)}"
+            )
+        start = time.monotonic()
+        if self.active < self.max_concurrency and not self.queued():
+            self.active += 1
+        else:
+            self.check_admission()
+            future = asyncio.get_running_loop().create_future()
+            entry = (PRIORITIES[priority], next(self.sequence), future, priority)
+            heapq.heappush(self.waiting, entry)
+            try:
+                # release() hands its slot over by resolving the future
+                await asyncio.wait_for(future, self.max_wait)
+            except asyncio.TimeoutError:
+                # The slot may have been handed over just as the wait ran out
+                if future.done() and not future.cancelled():
+                    self.release()
+                self.timed_out += 1
+                raise SchedulerBusy(
+                    f"No generation slot after {self.max_wait:.0f}s",
+                    self.retry_after(),
+                )
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release()
+                raise
+        self.admitted += 1
+        self.wait_times.append(time.monotonic() - start)
+
+    def release(self):
+        while self.waiting:
+            future = heapq.heappop(self.waiting)[2]
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority="interactive"):
+        await self.acquire(priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            duration = time.monotonic() - start
+            if self.average_duration is None:
+                self.average_duration = duration
+            else:
+                self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+            self.release()
+
+    def stats(self):
+        queued = self.queued()
+        waits = sorted(self.wait_times)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_depth": self.max_depth,
+            "max_wait": self.max_wait,
+            "active": self.active,
+            "queued": len(queued),
+            "queued_by_priority": {
+                name: sum(1 for entry in queued if entry[3] == name)
+                for name in PRIORITIES
+            },
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_p50": waits[len(waits) // 2] if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+            "average_generation_time": self.average_duration,
+        }
+
+
+# Shared by every async generation in the API process. The blocking
+# functions below are meant for scripts and do not go through it.
+scheduler = GenerationScheduler()
+
+
+def rag_prompt(question, context):
+    return f"""Given the following context, answer the question. If the answer is not in the context, say "I don't have enough information to answer that question."
 
 Context: {context}
 
@@ -37,21 +234,139 @@ Question: {question}
 
 Answer:"""
 
-    data = {
+
+async def generate_async(data):
+    response = await get_async_client().post(OLLAMA_URL, json=data)
+    response.raise_for_status()
+    return response.json()
+
+
+def generate(data):
+    response = get_client().post(OLLAMA_URL, json=data)
+    response.raise_for_status()
+    return response.json()
+
+
+def ollama_request(prompt, context):
+    return {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
+        "context": context,
+        "stream": False,
+    }
+
+
+def rag_request(question, context, max_tokens):
+    return {
+        "model": OLLAMA_MODEL,
+        "prompt": rag_prompt(question, context),
         "stream": False,
         "max_tokens": max_tokens,
     }
 
+
+def generation_stats(response):
+    # Token counts and timings from Ollama's (final) response. Durations are
+    # reported in nanoseconds and converted to seconds; prompt_eval_count is
+    # left out when the prompt was already cached.
+    seconds = {
+        name: response.get(name, 0) / 1e9
+        for name in (
+            "load_duration",
+            "prompt_eval_duration",
+            "eval_duration",
+            "total_duration",
+        )
+    }
+    prompt_tokens = response.get("prompt_eval_count", 0)
+    answer_tokens = response.get("eval_count", 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "answer_tokens": answer_tokens,
+        "total_tokens": prompt_tokens + answer_tokens,
+        **seconds,
+        "tokens_per_second": (
+            answer_tokens / seconds["eval_duration"]
+            if seconds["eval_duration"]
+            else 0.0
+        ),
+    }
+
+
+async def query_ollama_async(prompt, context, priority="interactive"):
     try:
+        async with scheduler.slot(priority):
+            data = ollama_request(prompt, context)
+            return (await generate_async(data))["response"]
+    except httpx.HTTPError as e:
+        print(f"Error querying Ollama: {e}")
+        return None
+
+
+async def rag_generate_async(question, context, max_tokens=300, priority="interactive"):
+    # Returns (answer, generation_stats). Errors are raised so that callers
+    # can tell a failed generation from an answer.
+    async with scheduler.slot(priority):
         logger.info(f"Sending request to Ollama API: {OLLAMA_URL}")
-        response = requests.post(OLLAMA_URL, json=data, timeout=240)  # Set a timeout
-        response.raise_for_status()
-        return response.json()["response"]
-    except requests.RequestException as e:
+        data = rag_request(question, context, max_tokens)
+        response = await generate_async(data)
+        return response["response"], generation_stats(response)
+
+
+async def rag_query_async(question, context, max_tokens=300, priority="interactive"):
+    try:
+        answer, _ = await rag_generate_async(question, context, max_tokens, priority)
+        return answer
+    except httpx.HTTPError as e:
+        logger.error(f"Error querying Ollama: {str(e)}")
+        return ERROR_ANSWER
+
+
+async def rag_query_stream(question, context, max_tokens=300, priority="interactive"):
+    # Yields Ollama's NDJSON chunks as they arrive: {"response": <token>, ...}
+    # per token and a final chunk with "done": true and the counts and
+    # durations that generation_stats() reads.
+    # Errors are raised, since part of the answer may already have been sent.
+    data = {**rag_request(question, context, max_tokens), "stream": True}
+    async with scheduler.slot(priority):
+        logger.info(f"Streaming from Ollama API: {OLLAMA_URL}")
+        client = get_async_client()
+        async with client.stream("POST", OLLAMA_URL, json=data) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise GenerationError(f"Ollama error: {chunk['error']}")
+                yield chunk
+                if chunk.get("done"):
+                    return
+    raise GenerationError("Ollama stream ended without a final chunk")
+
+
+# Blocking versions of the above for scripts; they share the request and
+# error handling but go through the synchronous client
+def query_ollama(prompt, context):
+    try:
+        return generate(ollama_request(prompt, context))["response"]
+    except httpx.HTTPError as e:
+        print(f"Error querying Ollama: {e}")
+        return None
+
+
+def rag_generate(question, context, max_tokens=300):
+    logger.info(f"Sending request to Ollama API: {OLLAMA_URL}")
+    response = generate(rag_request(question, context, max_tokens))
+    return response["response"], generation_stats(response)
+
+
+def rag_query(question, context, max_tokens=300):
+    try:
+        return rag_generate(question, context, max_tokens)[0]
+    except httpx.HTTPError as e:
         logger.error(f"Error querying Ollama: {str(e)}")
-        return "I'm sorry, but I encountered an error while processing your request."
+        return ERROR_ANSWER
 
 
 def warmup_ollama():
@@ -1,5 +1 @@
-from sentence_transformers import SentenceTransformer
-
-
-def get_sentence_transformer():
-    return SentenceTransformer("all-MiniLM-L6-v2")
+from src.models.model_registry import get_sentence_transformer
@@ -0,0 +1,120 @@
+import time
+import logging
+import threading
+import numpy as np
+from src.utils.config import (
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_MAX_ITEMS,
+    ANSWER_CACHE_TTL,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Generated answers keyed by the embedding of the question. A lookup returns
+# the entry of the most similar cached question when its cosine similarity is
+# at least threshold. Every entry belongs to one index version: a lookup with
+# a different version drops the whole cache, and once max_items is reached
+# the least recently used entry is replaced.
+class SemanticAnswerCache:
+    def __init__(
+        self,
+        max_items=ANSWER_CACHE_MAX_ITEMS,
+        threshold=ANSWER_CACHE_THRESHOLD,
+        ttl=ANSWER_CACHE_TTL,
+        clock=time.monotonic,
+    ):
+        self.max_items = max_items
+        self.threshold = threshold
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.index_version = None
+        # Normalized question vectors, allocated on the first store
+        self.vectors = None
+        self.entries = []
+        self.stored_at = np.zeros(max_items, dtype=np.float64)
+        self.last_used = np.zeros(max_items, dtype=np.float64)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def check_version(self, index_version):
+        if index_version == self.index_version:
+            return
+        if self.entries:
+            logger.info(
+                f"Index changed ({self.index_version} -> {index_version}), "
+                f"dropping {len(self.entries)} cached answers"
+            )
+            self.invalidations += 1
+        self.entries = []
+        self.index_version = index_version
+
+    def lookup(self, query_vector, index_version):
+        # Returns (entry, similarity, age in seconds) or (None, None, None)
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self.lock:
+            self.check_version(index_version)
+            count = len(self.entries)
+            if count:
+                now = self.clock()
+                scores = self.vectors[:count] @ query
+                if self.ttl > 0:
+                    scores[now - self.stored_at[:count] > self.ttl] = -np.inf
+                row = int(np.argmax(scores))
+                if scores[row] >= self.threshold:
+                    self.last_used[row] = now
+                    self.hits += 1
+                    age = float(now - self.stored_at[row])
+                    return self.entries[row], float(scores[row]), age
+            self.misses += 1
+            return None, None, None
+
+    def store(self, query_vector, entry, index_version):
+        query = np.asarray(query_vector, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        with self.lock:
+            # An answer generated while the index was being rebuilt is stale
+            if index_version != self.index_version:
+                return
+            if self.vectors is None or self.vectors.shape[1] != len(query):
+                self.vectors = np.zeros((self.max_items, len(query)), np.float32)
+                self.entries = []
+            if len(self.entries) < self.max_items:
+                row = len(self.entries)
+                self.entries.append(entry)
+            else:
+                row = int(np.argmin(self.last_used))
+                self.entries[row] = entry
+                self.evictions += 1
+            self.vectors[row] = query
+            self.stored_at[row] = self.last_used[row] = self.clock()
+
+    def clear(self):
+        with self.lock:
+            self.entries = []
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_items": self.max_items,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "index_version": self.index_version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache()
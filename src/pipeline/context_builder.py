@@ -0,0 +1,137 @@
+import os
+import re
+import math
+import logging
+from src.ingestion.markdown_parsing import extract_terms
+
+logger = logging.getLogger(__name__)
+
+# Tokens of retrieved text allowed in the prompt, titles included. Leave room
+# in the model's context window for the instructions, question and answer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+# Sections longer than this are split into runs of whole lines, and lines
+# longer than this into runs of whole sentences
+CONTEXT_MAX_PASSAGE_TOKENS = int(os.getenv("CONTEXT_MAX_PASSAGE_TOKENS", "200"))
+
+TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+HEADING_MAX_WORDS = 8
+
+
+def count_tokens(text):
+    # Approximates a BPE tokenizer without loading one: every punctuation
+    # mark is a token and words count one token per four characters
+    return sum(math.ceil(len(piece) / 4) for piece in TOKEN_PIECES.findall(text))
+
+
+def looks_like_heading(line):
+    return (
+        len(line.split()) <= HEADING_MAX_WORDS
+        and line[0].isupper()
+        and not line.endswith((".", "!", "?", ":", ",", ";"))
+    )
+
+
+def is_heading(lines, i):
+    # Indexed content is the parsed HTML's text, one element per line, with
+    # no markup left. A heading is a short capitalized line without closing
+    # punctuation, followed by a capitalized line. Inline fragments (bold or
+    # linked words) are followed by the rest of their sentence instead, and
+    # table cells follow another short line.
+    return (
+        0 < i < len(lines) - 1
+        and looks_like_heading(lines[i])
+        and lines[i + 1][0].isupper()
+        and not looks_like_heading(lines[i - 1])
+    )
+
+
+def runs(pieces, max_tokens, separator):
+    # Greedily joins pieces into runs of at most max_tokens; a single piece
+    # over the limit becomes a run of its own
+    grouped = []
+    run = []
+    run_tokens = 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if run and run_tokens + tokens > max_tokens:
+            grouped.append(separator.join(run))
+            run, run_tokens = [], 0
+        run.append(piece)
+        run_tokens += tokens
+    if run:
+        grouped.append(separator.join(run))
+    return grouped
+
+
+def split_passages(content, max_tokens=CONTEXT_MAX_PASSAGE_TOKENS):
+    # Passages start at headings and keep the content's line breaks, so list
+    # items and table rows stay on their own lines
+    lines = [line.strip() for line in (content or "").split("\n") if line.strip()]
+    sections = []
+    for i, line in enumerate(lines):
+        if not sections or is_heading(lines, i):
+            sections.append([])
+        if count_tokens(line) > max_tokens:
+            sections[-1].extend(runs(SENTENCE_END.split(line), max_tokens, " "))
+        else:
+            sections[-1].append(line)
+    return [
+        passage for section in sections for passage in runs(section, max_tokens, "\n")
+    ]
+
+
+def passage_key(passage):
+    return " ".join(passage.lower().split())
+
+
+def build_context(query, documents, budget=CONTEXT_TOKEN_BUDGET):
+    # Packs the most valuable passages of the ranked documents into budget
+    # tokens. A passage is worth more the higher its document ranks and the
+    # more query terms it contains; passages repeated across documents are
+    # kept once. The result lists the chosen passages under their document's
+    # title, documents in rank order and passages in their original order.
+    query_terms = extract_terms(query)
+    candidates = []
+    seen = set()
+    duplicates = 0
+    for rank, doc in enumerate(documents):
+        for position, passage in enumerate(split_passages(doc.get("content", ""))):
+            key = passage_key(passage)
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            terms = extract_terms(passage)
+            overlap = len(set(query_terms) & set(terms)) / max(len(query_terms), 1)
+            value = (0.5 + overlap) / (1 + rank)
+            candidates.append((value, rank, position, passage, count_tokens(passage)))
+
+    titles = {}
+    chosen = []
+    used = 0
+    for value, rank, position, passage, tokens in sorted(
+        candidates, key=lambda candidate: (-candidate[0], candidate[1], candidate[2])
+    ):
+        title_tokens = 0
+        if rank not in titles:
+            title = documents[rank].get("title") or "Untitled"
+            title_tokens = count_tokens(title) + 1
+        if used + tokens + title_tokens > budget:
+            continue
+        if rank not in titles:
+            titles[rank] = f"## {title}"
+        chosen.append((rank, position, passage))
+        used += tokens + title_tokens
+
+    sections = []
+    for rank in sorted(titles):
+        passages = [passage for r, _, passage in sorted(chosen) if r == rank]
+        sections.append("\n".join([titles[rank]] + passages))
+    context = "\n\n".join(sections)
+    logger.info(
+        f"Context: {len(chosen)} of {len(candidates)} passages from "
+        f"{len(titles)} documents, ~{used}/{budget} tokens, "
+        f"{duplicates} duplicate passages dropped"
+    )
+    return context
@@ -1,22 +1,33 @@
 import logging
+import httpx
 from datetime import datetime
-from src.ingestion.elasticsearch_ingestion import retrieve_relevant_documents
-from src.models.ollama_interface import rag_query, warmup_ollama
+from src.ingestion.elasticsearch_ingestion import (
+    retrieve_relevant_documents,
+    retrieve_relevant_documents_async,
+    get_index_version,
+    get_index_version_async,
+)
+from src.models.ollama_interface import (
+    rag_generate,
+    rag_generate_async,
+    rag_query_stream,
+    generation_stats,
+    warmup_ollama,
+    SchedulerBusy,
+    ERROR_ANSWER,
+)
 from src.evaluation.metrics import evaluate_retrieval, evaluate_answer
-from src.utils.config import OLLAMA_URL, OLLAMA_MODEL
-from src.ingestion.reranking import rerank_documents
+from src.utils.config import OLLAMA_URL, OLLAMA_MODEL, ANSWER_CACHE_ENABLED
 import json
 from pathlib import Path
-from transformers import AutoTokenizer
+from src.models.embedding_cache import embed_query
+from src.utils.executor import run_blocking
+from .answer_cache import answer_cache
+from .context_builder import build_context
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize the tokenizer globally to avoid reloading it for each function call
-tokenizer = AutoTokenizer.from_pretrained(
-    "gpt2"
-)  # You can change this to match your model
-
 
 def collect_user_feedback(
     question, generated_answer, user_rating, response_time=0, topic=None, error=None
@@ -48,86 +59,244 @@ def store_feedback(feedback):
             json.dump([feedback], f, indent=2)
 
 
+def semantic_cache_hit(query, index_version):
+    # Returns (cached result or None, query vector); paraphrases of a question
+    # answered against the same index get the cached answer without retrieval
+    # or generation
+    if index_version is None:
+        return None, None
+
+    query_vector = embed_query(query)
+    entry, similarity, age = answer_cache.lookup(query_vector, index_version)
+    if entry is None:
+        return None, query_vector
+    logger.info(
+        f"Answer cache hit for {query!r}: {entry['question']!r} "
+        f"(similarity {similarity:.3f}, {age:.0f}s old)"
+    )
+    result = {
+        **entry,
+        "question": query,
+        "cache": {
+            "hit": True,
+            "type": "semantic",
+            "similarity": similarity,
+            "age": age,
+            "cached_question": entry["question"],
+        },
+    }
+    return result, query_vector
+
+
+async def semantic_cache_hit_async(query):
+    index_version = await get_index_version_async() if ANSWER_CACHE_ENABLED else None
+    cached, query_vector = await run_blocking(semantic_cache_hit, query, index_version)
+    return cached, query_vector, index_version
+
+
 def run_rag_pipeline(query):
+    # Blocking version for scripts and evaluation; the API awaits
+    # run_rag_pipeline_async. Results with an "error" (failed retrieval or
+    # generation) are never cached.
+    index_version = get_index_version() if ANSWER_CACHE_ENABLED else None
+    cached, query_vector = semantic_cache_hit(query, index_version)
+    if cached is not None:
+        return cached
+
+    result = answer_question(query)
+    if query_vector is not None and "error" not in result:
+        answer_cache.store(query_vector, result, index_version)
+    return result
+
+
+async def run_rag_pipeline_async(query, priority="interactive"):
+    # priority is the generation queue priority, "interactive" or "batch"
+    cached, query_vector, index_version = await semantic_cache_hit_async(query)
+    if cached is not None:
+        return cached
+
+    result = await answer_question_async(query, priority)
+    if query_vector is not None and "error" not in result:
+        answer_cache.store(query_vector, result, index_version)
+    return result
+
+
+def log_question(query):
     logger.info(f"Received question: {query}")
     logger.info(f"Using Ollama URL: {OLLAMA_URL}")
     logger.info(f"Using Ollama Model: {OLLAMA_MODEL}")
 
-    try:
-        # Retrieve relevant documents from Elasticsearch
-        relevant_docs = retrieve_relevant_documents(query, method="semantic", top_k=10)
-        logger.info(f"Retrieved {len(relevant_docs)} relevant documents")
 
-        # Rerank documents
-        reranked_docs = rerank_documents(query, relevant_docs, top_k=5)
-        logger.info(f"Reranked to {len(reranked_docs)} documents")
+def retrieve_context(query):
+    log_question(query)
+    # Retrieve relevant documents from Elasticsearch; they come back
+    # reranked, and the context is packed from them best first
+    relevant_docs = retrieve_relevant_documents(query, method="semantic", top_k=10)
+    logger.info(f"Retrieved {len(relevant_docs)} relevant documents")
+    return relevant_docs, build_context(query, relevant_docs)
+
+
+async def retrieve_context_async(query):
+    log_question(query)
+    relevant_docs = await retrieve_relevant_documents_async(
+        query, method="semantic", top_k=10
+    )
+    logger.info(f"Retrieved {len(relevant_docs)} relevant documents")
+    return relevant_docs, await run_blocking(build_context, query, relevant_docs)
+
+
+def relevance_metrics(relevant_docs):
+    return {
+        "num_retrieved": len(relevant_docs),
+        "average_relevance": (
+            sum(doc.get("score", 0) for doc in relevant_docs) / len(relevant_docs)
+            if relevant_docs
+            else 0
+        ),
+        "max_relevance": max((doc.get("score", 0) for doc in relevant_docs), default=0),
+        "min_relevance": min((doc.get("score", 0) for doc in relevant_docs), default=0),
+    }
+
+
+def collect_file_references(relevant_docs):
+    file_references = [
+        doc.get("file_path", "") for doc in relevant_docs if "file_path" in doc
+    ]
+    logger.info(f"Collected file references: {file_references}")
+    return file_references
+
+
+def build_result(query, answer, relevant_docs, stats):
+    # Token counts and timings come from Ollama's response (generation_stats)
+    retrieval_metrics = {**relevance_metrics(relevant_docs), **stats}
+    logger.info(
+        f"Generated {stats['answer_tokens']} tokens at "
+        f"{stats['tokens_per_second']:.1f} tokens/s "
+        f"(prompt {stats['prompt_tokens']} tokens, "
+        f"load {stats['load_duration']:.2f}s)"
+    )
+
+    result = {
+        "question": query,
+        "answer": answer,
+        "retrieval_metrics": retrieval_metrics,
+        "file_references": collect_file_references(relevant_docs),
+    }
+    logger.info(f"RAG pipeline result: {result}")
+    return result
+
+
+def error_result(query, e):
+    logger.exception(f"Error in RAG pipeline: {str(e)}")
+    return {
+        "question": query,
+        "answer": f"An error occurred: {str(e)}",
+        "error": str(e),
+        "retrieval_metrics": {
+            "num_retrieved": 0,
+            "average_relevance": 0,
+            "max_relevance": 0,
+            "min_relevance": 0,
+            **generation_stats({}),
+        },
+    }
+
 
-        # Combine the content of relevant documents
-        context = "\n".join([doc.get("content", "") for doc in reranked_docs])
-        context = context[:2000]  # Limit context to 2000 characters
-        logger.info(f"Context length: {len(context)}")
+def failed_generation_result(query, relevant_docs, e):
+    # Ollama could not answer. The user gets the usual apology, and the
+    # "error" key keeps it out of the answer and response caches.
+    logger.error(f"Error querying Ollama: {str(e)}")
+    result = build_result(query, ERROR_ANSWER, relevant_docs, generation_stats({}))
+    return {**result, "error": str(e)}
+
+
+def answer_question(query):
+    try:
+        relevant_docs, context = retrieve_context(query)
 
         # Generate answer using Ollama
-        logger.info("Calling rag_query function")
-        answer = rag_query(query, context)
+        logger.info("Calling rag_generate function")
+        try:
+            answer, stats = rag_generate(query, context)
+        except httpx.HTTPError as e:
+            return failed_generation_result(query, relevant_docs, e)
         logger.info(f"Generated answer: {answer}")
 
-        # Calculate tokens for both query and answer
-        query_tokens = calculate_total_tokens(query)
-        answer_tokens = calculate_total_tokens(answer)
-        total_tokens = query_tokens + answer_tokens
-
-        retrieval_metrics = {
-            "num_retrieved": len(relevant_docs),
-            "average_relevance": (
-                sum(doc.get("score", 0) for doc in relevant_docs) / len(relevant_docs)
-                if relevant_docs
-                else 0
-            ),
-            "max_relevance": max(
-                (doc.get("score", 0) for doc in relevant_docs), default=0
-            ),
-            "min_relevance": min(
-                (doc.get("score", 0) for doc in relevant_docs), default=0
-            ),
-            "total_tokens": total_tokens,
-            "query_tokens": query_tokens,
-            "answer_tokens": answer_tokens,
-        }
+        return build_result(query, answer, relevant_docs, stats)
+    except Exception as e:
+        return error_result(query, e)
 
-        # Add file references to the response
-        file_references = [
-            doc.get("file_path", "") for doc in relevant_docs if "file_path" in doc
-        ]
-        logger.info(f"Collected file references: {file_references}")
 
-        result = {
-            "question": query,
-            "answer": answer,
-            "retrieval_metrics": retrieval_metrics,
-            "file_references": file_references,
-        }
-        logger.info(f"RAG pipeline result: {result}")
-        return result
+async def answer_question_async(query, priority="interactive"):
+    try:
+        relevant_docs, context = await retrieve_context_async(query)
+
+        # Generate answer using Ollama
+        logger.info("Calling rag_generate_async function")
+        try:
+            answer, stats = await rag_generate_async(query, context, priority=priority)
+        except httpx.HTTPError as e:
+            return failed_generation_result(query, relevant_docs, e)
+        logger.info(f"Generated answer: {answer}")
+
+        return build_result(query, answer, relevant_docs, stats)
+    except SchedulerBusy:
+        # Left to the API, which answers 429 with Retry-After
+        raise
     except Exception as e:
-        logger.exception(f"Error in RAG pipeline: {str(e)}")
-        return {
+        return error_result(query, e)
+
+
+async def replay_result(result):
+    # A cached answer is sent as the same events, with the answer as one token
+    yield "metadata", {
+        "question": result["question"],
+        "retrieval_metrics": result["retrieval_metrics"],
+        "file_references": result.get("file_references", []),
+        "cache": result.get("cache", {"hit": False}),
+    }
+    yield "token", {"text": result["answer"]}
+    yield "done", result
+
+
+async def stream_rag_pipeline(query, priority="interactive"):
+    # Yields (event, data) pairs: "metadata" with the retrieval metrics and
+    # file references as soon as retrieval is done, a "token" per generated
+    # token, then "done" with the full result (or "error").
+    try:
+        cached, query_vector, index_version = await semantic_cache_hit_async(query)
+        if cached is not None:
+            async for event in replay_result(cached):
+                yield event
+            return
+
+        relevant_docs, context = await retrieve_context_async(query)
+        yield "metadata", {
             "question": query,
-            "answer": f"An error occurred: {str(e)}",
-            "retrieval_metrics": {
-                "num_retrieved": 0,
-                "average_relevance": 0,
-                "max_relevance": 0,
-                "min_relevance": 0,
-                "total_tokens": 0,
-                "query_tokens": 0,
-                "answer_tokens": 0,
-            },
+            "retrieval_metrics": relevance_metrics(relevant_docs),
+            "file_references": collect_file_references(relevant_docs),
+            "cache": {"hit": False},
         }
 
+        parts = []
+        stats = generation_stats({})
+        async for chunk in rag_query_stream(query, context, priority=priority):
+            if chunk.get("response"):
+                parts.append(chunk["response"])
+                yield "token", {"text": chunk["response"]}
+            if chunk.get("done"):
+                stats = generation_stats(chunk)
+        answer = "".join(parts)
+        logger.info(f"Generated answer: {answer}")
 
-def calculate_total_tokens(text):
-    return len(tokenizer.encode(text))
+        result = build_result(query, answer, relevant_docs, stats)
+        if query_vector is not None:
+            answer_cache.store(query_vector, result, index_version)
+        yield "done", {**result, "cache": {"hit": False}}
+    except SchedulerBusy as e:
+        yield "error", {**error_result(query, e), "retry_after": e.retry_after}
+    except Exception as e:
+        yield "error", error_result(query, e)
 
 
 if __name__ == "__main__":
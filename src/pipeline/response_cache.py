@@ -0,0 +1,181 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from src.ingestion.query_rewriting import expand_dnd_specific_terms
+from src.models.embedding_cache import normalize_text
+from src.utils.ttl_cache import TTLCache
+from src.utils.config import (
+    RESPONSE_CACHE_MAX_ITEMS,
+    RESPONSE_CACHE_TTL,
+    RESPONSE_CACHE_DIR,
+    RESPONSE_CACHE_DISK_MAX_ITEMS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_query(question):
+    # "What is AC?" and "what is  armor class" share a key: punctuation is
+    # dropped so abbreviations are whole words, then they get the same
+    # expansion as retrieval, with case and whitespace folded
+    words = re.findall(r"\w+", normalize_text(question).lower())
+    return expand_dnd_specific_terms(" ".join(words))
+
+
+def query_key(question):
+    return hashlib.sha256(canonical_query(question).encode("utf-8")).hexdigest()
+
+
+# Exact-match cache of API responses keyed by the canonical question. Entries
+# live in an in-memory LRU/TTL cache and, when directory is set, also as one
+# JSON file per key so they survive restarts and are shared between workers.
+# Every entry records the index version it was answered from and only counts
+# as a hit for that version.
+class ResponseCache:
+    def __init__(
+        self,
+        max_items=RESPONSE_CACHE_MAX_ITEMS,
+        ttl=RESPONSE_CACHE_TTL,
+        directory=RESPONSE_CACHE_DIR,
+        disk_max_items=RESPONSE_CACHE_DISK_MAX_ITEMS,
+    ):
+        self.memory = TTLCache(max_items, ttl)
+        self.ttl = ttl
+        self.directory = directory
+        self.disk_max_items = disk_max_items
+        self.lock = threading.Lock()
+        self.index_version = None
+        self.disk_hits = 0
+        self.disk_writes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def check_version(self, index_version):
+        with self.lock:
+            if index_version != self.index_version:
+                if len(self.memory):
+                    logger.info(
+                        f"Index changed, dropping {len(self.memory)} cached responses"
+                    )
+                self.memory.clear()
+                self.index_version = index_version
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def read_disk(self, key, index_version):
+        path = self.path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        expired = self.ttl > 0 and time.time() - entry["stored_at"] > self.ttl
+        if entry["index_version"] != index_version or expired:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry
+
+    def write_disk(self, key, entry):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        self.disk_writes += 1
+        if self.disk_writes % 100 == 0:
+            self.prune_disk()
+
+    def prune_disk(self):
+        # Drops the oldest files once the directory holds too many entries
+        paths = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        if len(paths) <= self.disk_max_items:
+            return
+        paths.sort(key=lambda path: os.path.getmtime(path))
+        for path in paths[: len(paths) - self.disk_max_items]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, question, index_version):
+        # Returns (response, age in seconds, "memory" or "disk") or
+        # (None, None, None)
+        self.check_version(index_version)
+        key = query_key(question)
+        entry = self.memory.get(key)
+        tier = "memory"
+        if entry is None and self.directory:
+            entry = self.read_disk(key, index_version)
+            if entry is not None:
+                self.disk_hits += 1
+                self.memory.put(key, entry)
+                tier = "disk"
+        if entry is None:
+            return None, None, None
+        # Entries promoted from disk keep their original age
+        age = time.time() - entry["stored_at"]
+        if self.ttl > 0 and age > self.ttl:
+            self.memory.pop(key)
+            return None, None, None
+        return entry["response"], age, tier
+
+    def put(self, question, response, index_version):
+        # A response generated while the index was being rebuilt is stale
+        if index_version != self.index_version:
+            return
+        key = query_key(question)
+        entry = {
+            "question": canonical_query(question),
+            "index_version": index_version,
+            "stored_at": time.time(),
+            "response": response,
+        }
+        self.memory.put(key, entry)
+        if self.directory:
+            try:
+                self.write_disk(key, entry)
+            except (OSError, TypeError) as e:
+                logger.warning(f"Could not write cached response to disk: {e}")
+
+    def stats(self):
+        stats = self.memory.stats()
+        stats["index_version"] = self.index_version
+        stats["directory"] = self.directory or None
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_writes"] = self.disk_writes
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def cache_response(question, result, index_version, cache=None):
+    # Stores a pipeline result and returns the API response for it. Results
+    # with an "error" (failed retrieval, or a failed generation answered with
+    # the apology) are returned with their error, for the interaction log, but
+    # never cached, in memory or on disk.
+    if cache is None:
+        cache = response_cache
+    response = {
+        "question": result["question"],
+        "answer": result["answer"],
+        "retrieval_metrics": result["retrieval_metrics"],
+        "file_references": result.get("file_references", []),
+    }
+    if "error" in result:
+        return {**response, "error": result["error"], "cache": {"hit": False}}
+    if index_version is not None:
+        cache.put(question, response, index_version)
+    return {**response, "cache": result.get("cache", {"hit": False})}
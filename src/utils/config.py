@@ -23,5 +23,38 @@ OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "mistral:latest")
 # Data directory
 DATA_DIR = os.getenv("DATA_DIR", "./data/dnd_srd")
 
+# Embedding model shared by ingestion, retrieval, reranking and evaluation
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "all-MiniLM-L6-v2")
+
+# Device ("cpu", "cuda", ...; empty lets sentence-transformers choose) and
+# torch thread count (0 keeps torch's default) for locally loaded models
+MODEL_DEVICE = os.getenv("MODEL_DEVICE", "")
+MODEL_THREADS = int(os.getenv("MODEL_THREADS", "0"))
+
+# Persistent embedding cache
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./data/embedding_cache")
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "10000"))
+
+# In-memory cache of query embeddings (seconds; 0 disables expiry)
+QUERY_CACHE_MAX_ITEMS = int(os.getenv("QUERY_CACHE_MAX_ITEMS", "2048"))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", "3600"))
+
+# Semantic answer cache: a question whose embedding has at least this cosine
+# similarity to a cached question gets the cached answer (TTL in seconds;
+# 0 disables expiry)
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_MAX_ITEMS = int(os.getenv("ANSWER_CACHE_MAX_ITEMS", "1000"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+
+# Exact-match cache of API responses. RESPONSE_CACHE_DIR adds an on-disk tier
+# that survives restarts and is shared by workers (empty keeps it in memory)
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ITEMS = int(os.getenv("RESPONSE_CACHE_MAX_ITEMS", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_DIR = os.getenv("RESPONSE_CACHE_DIR", "")
+RESPONSE_CACHE_DISK_MAX_ITEMS = int(os.getenv("RESPONSE_CACHE_DISK_MAX_ITEMS", "10000"))
+
 print(f"OLLAMA_URL: {OLLAMA_URL}")
 print(f"OLLAMA_MODEL: {OLLAMA_MODEL}")
@@ -95,6 +95,8 @@ def track_system_usage(interactions):
 
 def analyze_answer_metrics(interactions):
     total_tokens = 0
+    # Generation speed, from interactions recorded with Ollama's timings
+    tokens_per_second = []
     source_types = defaultdict(int)
     interactions_with_metrics = 0
 
@@ -108,6 +110,8 @@ def analyze_answer_metrics(interactions):
                     tokens = metrics.get("total_tokens", 0)
                     print(f"Tokens: {tokens}")
                     total_tokens += tokens
+                    if metrics.get("tokens_per_second"):
+                        tokens_per_second.append(metrics["tokens_per_second"])
                     for source in metrics.get("sources", []):
                         source_type = source.get("type", "unknown")
                         source_types[source_type] += 1
@@ -126,4 +130,12 @@ def analyze_answer_metrics(interactions):
     print(f"Interactions with metrics: {interactions_with_metrics}")
     print(f"Average tokens: {avg_tokens}")
 
-    return {"average_tokens": round(avg_tokens, 2), "source_types": dict(source_types)}
+    avg_tokens_per_second = (
+        sum(tokens_per_second) / len(tokens_per_second) if tokens_per_second else 0
+    )
+
+    return {
+        "average_tokens": round(avg_tokens, 2),
+        "average_tokens_per_second": round(avg_tokens_per_second, 2),
+        "source_types": dict(source_types),
+    }
@@ -0,0 +1,45 @@
+import os
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Threads for CPU-bound and blocking work called from async code (embedding,
+# reranking, tokenization, database writes). Bounded so a burst of requests
+# queues here instead of starting one thread per request.
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "4"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_WORKERS, thread_name_prefix="blocking"
+)
+_lock = threading.Lock()
+_pending = 0
+_completed = 0
+
+
+def _run(func):
+    global _pending, _completed
+    try:
+        return func()
+    finally:
+        with _lock:
+            _pending -= 1
+            _completed += 1
+
+
+async def run_blocking(func, *args, **kwargs):
+    # Runs func(*args, **kwargs) on the bounded executor and awaits the result
+    global _pending
+    with _lock:
+        _pending += 1
+    call = functools.partial(func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(_executor, _run, call)
+
+
+def executor_stats():
+    with _lock:
+        return {
+            "workers": BLOCKING_WORKERS,
+            "pending": _pending,
+            "completed": _completed,
+        }
@@ -0,0 +1,65 @@
+import time
+import asyncio
+
+
+# Coalesces concurrent calls with the same key: the first caller starts the
+# computation as a task and later callers await that same task instead of
+# starting their own. The task is shielded, so a caller that disconnects does
+# not cancel the computation for everyone else.
+class SingleFlight:
+    def __init__(self):
+        # key -> {"task", "waiters", "started_at"}
+        self.calls = {}
+        self.computations = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    async def run(self, key, func):
+        # Returns (result of func(), whether it was shared with another caller)
+        task, shared = self.start(key, func)
+        return await asyncio.shield(task), shared
+
+    def start(self, key, func):
+        # Returns (the task computing key, whether it was already running)
+        # without waiting for it, for callers that follow the computation
+        # some other way while it runs
+        call = self.calls.get(key)
+        shared = call is not None
+        if shared:
+            call["waiters"] += 1
+            self.coalesced += 1
+        else:
+            call = {
+                "task": asyncio.ensure_future(func()),
+                "waiters": 0,
+                "started_at": time.monotonic(),
+            }
+            self.calls[key] = call
+            self.computations += 1
+            call["task"].add_done_callback(lambda task: self.finish(key, call))
+        return call["task"], shared
+
+    def finish(self, key, call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
+        self.max_waiters = max(self.max_waiters, call["waiters"])
+        # Marks the exception as retrieved when every caller has gone away
+        if not call["task"].cancelled():
+            call["task"].exception()
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            "in_flight": len(self.calls),
+            "computations": self.computations,
+            "coalesced": self.coalesced,
+            "max_waiters": self.max_waiters,
+            "keys": [
+                {
+                    "key": key,
+                    "waiters": call["waiters"],
+                    "age": now - call["started_at"],
+                }
+                for key, call in self.calls.items()
+            ],
+        }
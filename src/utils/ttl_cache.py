@@ -0,0 +1,73 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+# Thread-safe LRU cache with an optional time-to-live. Entries expire ttl
+# seconds after they were stored (ttl <= 0 keeps them until evicted), and the
+# least recently used entry is evicted once max_items is reached.
+class TTLCache:
+    def __init__(self, max_items, ttl=0, clock=time.monotonic):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.clock = clock
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def get_with_age(self, key):
+        # Returns (value, age in seconds), or (None, None) on a miss
+        with self.lock:
+            entry = self.items.get(key)
+            if entry is not None:
+                value, stored_at = entry
+                age = self.clock() - stored_at
+                if self.ttl > 0 and age > self.ttl:
+                    del self.items[key]
+                    self.expired += 1
+                else:
+                    self.items.move_to_end(key)
+                    self.hits += 1
+                    return value, age
+            self.misses += 1
+            return None, None
+
+    def get(self, key):
+        return self.get_with_age(key)[0]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (value, self.clock())
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        with self.lock:
+            entry = self.items.pop(key, None)
+            return entry[0] if entry else None
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.items),
+                "max_items": self.max_items,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.pipeline.answer_cache import SemanticAnswerCache
+
+
+def test_near_duplicate_question_hits_until_index_changes():
+    cache = SemanticAnswerCache(max_items=10, threshold=0.9)
+    cache.lookup([1.0, 0.0, 0.0], "v1")
+    cache.store([1.0, 0.0, 0.0], {"answer": "grapple"}, "v1")
+
+    entry, similarity, _ = cache.lookup([0.95, 0.1, 0.0], "v1")
+    assert entry == {"answer": "grapple"} and similarity > 0.9
+    assert cache.lookup([0.5, 0.8, 0.0], "v1")[0] is None
+
+    # A rebuilt index drops everything answered from the old one
+    assert cache.lookup([1.0, 0.0, 0.0], "v2")[0] is None
+    assert len(cache) == 0
+    cache.store([1.0, 0.0, 0.0], {"answer": "stale"}, "v1")
+    assert len(cache) == 0
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_least_recently_used_answer_is_replaced():
+    cache = SemanticAnswerCache(max_items=2, threshold=0.99)
+    vectors = np.eye(3)
+    cache.lookup(vectors[0], "v1")
+    cache.store(vectors[0], {"answer": "a"}, "v1")
+    cache.store(vectors[1], {"answer": "b"}, "v1")
+    cache.lookup(vectors[0], "v1")
+    cache.store(vectors[2], {"answer": "c"}, "v1")
+
+    assert cache.lookup(vectors[1], "v1")[0] is None
+    assert cache.lookup(vectors[0], "v1")[0] == {"answer": "a"}
+    assert cache.lookup(vectors[2], "v1")[0] == {"answer": "c"}
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,95 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestion import elasticsearch_ingestion
+from src.ingestion.bm25_index import build_bm25_index, load_bm25_index
+from src.ingestion.vector_store import VectorStore, write_vector_store
+
+DOCUMENTS = [
+    (
+        "grapple",
+        {
+            "title": "Grappling",
+            "content": "When you want to grab a creature or wrestle with it, "
+            "you can use the Attack action to make a special melee attack, a grapple.",
+            "type": "combat",
+            "content_vector": [0.0, 1.0],
+        },
+    ),
+    (
+        "shove",
+        {
+            "title": "Shoving a Creature",
+            "content": "Using the Attack action, you can make a special melee "
+            "attack to shove a creature.",
+            "type": "combat",
+            "content_vector": [0.6, 0.8],
+        },
+    ),
+    (
+        "fireball",
+        {
+            "title": "Fireball",
+            "content": "A bright streak flashes to a point you choose and "
+            "blossoms into an explosion of flame.",
+            "type": "spells",
+            "content_vector": [1.0, 0.0],
+        },
+    ),
+]
+
+
+def test_bm25_ranking_and_persistence(tmp_path):
+    index = build_bm25_index(DOCUMENTS)
+
+    results = index.search("wrestle grapple creature", top_k=3)
+    assert [index.ids[row] for row, _ in results] == ["grapple", "shove"]
+    # The title boost ranks the matching title first
+    assert index.ids[index.search("fireball explosion")[0][0]] == "fireball"
+
+    index.save(str(tmp_path))
+    loaded = load_bm25_index(str(tmp_path))
+    assert loaded.search("wrestle grapple creature", top_k=3) == results
+
+
+def test_local_lexical_and_hybrid_retrieval(tmp_path, monkeypatch):
+    build_bm25_index(DOCUMENTS).save(str(tmp_path))
+    write_vector_store(DOCUMENTS, str(tmp_path))
+    store = VectorStore(str(tmp_path))
+    monkeypatch.setattr(elasticsearch_ingestion, "get_vector_store", lambda: store)
+    monkeypatch.setattr(elasticsearch_ingestion, "encode_query", lambda q: [1.0, 0.0])
+
+    def retrieve(method, **kwargs):
+        documents = elasticsearch_ingestion.retrieve_relevant_documents(
+            "shove a creature",
+            method=method,
+            top_k=2,
+            rerank=False,
+            rewrite_query=False,
+            backend="local",
+            **kwargs,
+        )
+        return [doc["_id"] for doc in documents]
+
+    assert retrieve("bm25") == ["shove", "grapple"]
+    assert retrieve("keyword") == ["shove", "grapple"]
+    assert retrieve("hybrid") == ["shove", "fireball"]
+    assert retrieve("hybrid", filters={"type": "combat"}) == ["shove", "grapple"]
+
+
+def test_documents_score_their_best_boosted_field():
+    index = build_bm25_index(DOCUMENTS)
+    term_ids = [index.vocabulary["creature"]]
+    title = 2.0 * index.field_scores("title", term_ids)
+    content = index.field_scores("content", term_ids)
+
+    # "Shoving a Creature" matches in both fields; multi_match's best_fields
+    # keeps the larger boosted score instead of adding them up
+    scores = index.scores("creature")
+    assert scores.tolist() == [max(t, c) for t, c in zip(title, content)]
+    shove = index.ids.index("shove")
+    assert title[shove] > 0 and content[shove] > 0
+    assert scores[shove] < title[shove] + content[shove]
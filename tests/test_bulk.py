@@ -0,0 +1,84 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import time
+from types import SimpleNamespace
+from elasticsearch import Elasticsearch
+from src.ingestion.bulk import chunk_actions, bulk_index
+
+
+def index_action(doc_id, content):
+    return {
+        "_op_type": "index",
+        "_index": "dnd_5e_srd",
+        "_id": doc_id,
+        "_source": {"content": content},
+    }
+
+
+def test_chunks_are_capped_by_count_and_bytes():
+    actions = [index_action(str(i), "x" * 100) for i in range(5)]
+    # Each action is ~100 bytes of metadata plus its ~115 byte source
+    chunks = list(chunk_actions(actions, chunk_size=2, max_chunk_bytes=10_000))
+    assert [len(chunk) for chunk, _ in chunks] == [2, 2, 1]
+
+    chunks = list(chunk_actions(actions, chunk_size=100, max_chunk_bytes=700))
+    assert [len(chunk) for chunk, _ in chunks] == [3, 2]
+    assert all(size <= 700 for _, size in chunks)
+
+    # Sources are sent as the bytes they were sized from
+    source = chunks[0][0][0]["_source"]
+    assert json.loads(source) == {"content": "x" * 100}
+    assert actions[0]["_source"] == {"content": "x" * 100}
+
+
+def test_oversized_action_gets_a_chunk_of_its_own():
+    actions = [
+        index_action("small-1", "x"),
+        index_action("huge", "x" * 5000),
+        index_action("small-2", "x"),
+    ]
+    chunks = list(chunk_actions(actions, chunk_size=100, max_chunk_bytes=1000))
+    assert [[action["_id"] for action in chunk] for chunk, _ in chunks] == [
+        ["small-1"],
+        ["huge"],
+        ["small-2"],
+    ]
+    assert chunks[1][1] > 1000
+
+
+def test_rejected_documents_are_retried_with_capped_backoff(monkeypatch):
+    requests = []
+
+    def fake_bulk(self, operations, **kwargs):
+        ids = [json.loads(line)["index"]["_id"] for line in operations[::2]]
+        requests.append(ids)
+        # "b" is rejected twice with 429 before it gets in
+        items = [
+            {
+                "index": {
+                    "_id": doc_id,
+                    "status": 429 if doc_id == "b" and len(requests) < 3 else 201,
+                }
+            }
+            for doc_id in ids
+        ]
+        return SimpleNamespace(body={"errors": True, "items": items})
+
+    sleeps = []
+    monkeypatch.setattr(Elasticsearch, "bulk", fake_bulk)
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+
+    es = Elasticsearch("http://localhost:9200")
+    actions = [index_action(doc_id, "text") for doc_id in ["a", "b", "c"]]
+    success, failed = bulk_index(
+        es, actions, max_in_flight=1, initial_backoff=2, max_backoff=3
+    )
+
+    assert success == 3 and failed == []
+    assert requests == [["a", "b", "c"], ["b"], ["b"]]
+    assert sleeps == [2, 3]
@@ -0,0 +1,107 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown
+from bs4 import BeautifulSoup
+from src.ingestion.chunking import split_sections, split_tokens, build_chunks
+from src.ingestion.markdown_parsing import parse_file_worker
+
+
+def test_split_sections_at_h2_and_h3():
+    html = markdown.markdown(
+        "Intro text\n\n## Hit Points\n\nHit Dice: 1d8\n\n### Proficiencies\n\nArmor: Light armor\n\n#### Equipment\n\nA lute"
+    )
+    sections = split_sections(BeautifulSoup(html, "html.parser"))
+
+    assert [heading for heading, _, _ in sections] == [
+        None,
+        "Hit Points",
+        "Proficiencies",
+    ]
+    assert sections[1][1] == "Hit Points\nHit Dice: 1d8"
+    # h4 headings stay inside the enclosing section
+    assert "Equipment\nA lute" in sections[2][1]
+
+
+def test_split_tokens_caps_and_overlaps():
+    text = " ".join(f"w{i}" for i in range(25))
+    windows = split_tokens(text, max_tokens=10, overlap=2)
+
+    assert all(len(window.split()) <= 10 for window in windows)
+    assert windows[0].split()[-2:] == windows[1].split()[:2]
+    assert windows[-1].split()[-1] == "w24"
+    assert split_tokens("short text", max_tokens=10, overlap=2) == ["short text"]
+
+
+def test_build_chunks_keeps_parent_metadata():
+    document = {
+        "title": "Bard",
+        "content": "full text",
+        "file_path": "./data/dnd_srd/Classes/Bard.md",
+        "category": "Classes",
+        "tables": [{"title": "The Bard", "content": "<table></table>"}],
+        "lists": [],
+    }
+    spells = {"tables": [], "lists": [{"title": "Spellcasting", "items": ["Sleep"]}]}
+    chunks = build_chunks(
+        document,
+        [
+            (None, "intro", {"tables": [], "lists": []}),
+            ("Spellcasting", "spells", spells),
+        ],
+    )
+
+    assert [chunk["chunk_index"] for chunk in chunks] == [0, 1]
+    assert [chunk["section"] for chunk in chunks] == ["Bard", "Spellcasting"]
+    assert all(chunk["file_path"] == document["file_path"] for chunk in chunks)
+    assert all(chunk["title"] == "Bard" for chunk in chunks)
+    # Each chunk holds its own section's tables and lists, not the file's
+    assert chunks[0]["tables"] == [] and chunks[1]["lists"] == spells["lists"]
+
+
+def test_lean_layout_flattens_tables_and_lists(tmp_path):
+    path = tmp_path / "Equipment" / "Armor.md"
+    path.parent.mkdir()
+    path.write_text(
+        "# Armor\n\nLight armor:\n\n- Padded\n- Leather\n\n"
+        "| Armor | AC |\n|---|---|\n| Padded | 11 |\n",
+        encoding="utf-8",
+    )
+
+    _, documents, error = parse_file_worker(str(path), layout="lean")
+
+    assert error is None
+    document = documents[0]
+    assert "tables" not in document and "lists" not in document
+    assert "Armor | AC\nPadded | 11" in document["tables_text"]
+    assert "- Padded\n- Leather" in document["lists_text"]
+
+
+def test_section_chunks_get_their_own_tables_and_lists(tmp_path):
+    path = tmp_path / "Equipment" / "Armor.md"
+    path.parent.mkdir()
+    path.write_text(
+        "# Armor\n\nArmor protects you.\n\n## Light Armor\n\n- Padded\n- Leather\n\n"
+        "## Heavy Armor\n\n| Armor | AC |\n|---|---|\n| Plate | 18 |\n",
+        encoding="utf-8",
+    )
+
+    _, chunks, error = parse_file_worker(str(path), chunking="sections")
+
+    assert error is None
+    assert [chunk["section"] for chunk in chunks] == [
+        "Armor",
+        "Light Armor",
+        "Heavy Armor",
+    ]
+    assert [len(chunk["tables"]) for chunk in chunks] == [0, 0, 1]
+    assert [len(chunk["lists"]) for chunk in chunks] == [0, 1, 0]
+    assert chunks[1]["lists"][0] == {
+        "title": "Light Armor",
+        "items": ["Padded", "Leather"],
+    }
+    assert chunks[2]["tables"][0]["title"] == "Heavy Armor"
+    assert "<td>Plate</td>" in chunks[2]["tables"][0]["content"]
@@ -0,0 +1,99 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestion.markdown_parsing import markdown_to_document
+from src.pipeline.context_builder import build_context, count_tokens, split_passages
+
+COMBAT = """# Combat
+
+A typical combat encounter is a clash between two sides. The game organizes
+combat into a cycle of **rounds** and turns.
+
+## Combat Step by Step
+
+1. Determine surprise.
+2. Establish positions.
+3. Roll initiative.
+
+## Armor
+
+| Armor | Cost | Armor Class (AC) |
+|---|---|---|
+| Padded | 5 gp | 11 + Dex modifier |
+| Leather | 10 gp | 11 + Dex modifier |
+
+## Surprise
+
+If you're surprised, you can't move or take an action on your first turn.
+"""
+
+
+def parse(tmp_path, name, markdown):
+    # Documents as the indexer stores them: content is the parsed HTML's text
+    path = tmp_path / "Gameplay" / f"{name}.md"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(markdown, encoding="utf-8")
+    return markdown_to_document(str(path))
+
+
+def test_passages_start_at_headings_and_keep_lines(tmp_path):
+    passages = split_passages(parse(tmp_path, "Combat", COMBAT)["content"])
+
+    assert [passage.split("\n")[0] for passage in passages[1:]] == [
+        "Combat Step by Step",
+        "Armor",
+        "Surprise",
+    ]
+    # Bold words stay inside their sentence's passage
+    assert passages[0].startswith("A typical combat encounter")
+    assert passages[0].endswith("and turns.")
+    # List items and table cells keep their own lines
+    assert passages[1].split("\n")[1:] == [
+        "Determine surprise.",
+        "Establish positions.",
+        "Roll initiative.",
+    ]
+    assert "Padded\n5 gp\n11 + Dex modifier" in passages[2]
+
+
+def test_long_lines_split_on_sentences(tmp_path):
+    paragraph = " ".join(f"Sentence number {i} is here." for i in range(40))
+    document = parse(tmp_path, "Long", f"# Long\n\nIntro.\n\n{paragraph}\n")
+    passages = split_passages(document["content"], max_tokens=30)
+
+    assert passages[0].startswith("Intro.\nSentence number 0 is here.")
+    assert all(count_tokens(passage) <= 30 for passage in passages)
+    assert all(passage.endswith("is here.") for passage in passages)
+    text = " ".join(passage.replace("\n", " ") for passage in passages)
+    assert text == f"Intro. {paragraph}"
+
+
+def test_budget_keeps_relevant_passages_once_under_titles(tmp_path):
+    shared = (
+        "## Grappling\n\nYou can grapple a creature no more than one size larger.\n"
+    )
+    documents = [
+        parse(
+            tmp_path,
+            "Grappling",
+            f"# Grappling\n\n{shared}\n## Improvising\n\nThe GM decides.\n",
+        ),
+        parse(
+            tmp_path,
+            "Combat",
+            f"# Combat\n\n{shared}\n## Conditions\n\nA grappled creature's speed is 0.\n",
+        ),
+        parse(tmp_path, "Spells", "# Spells\n\nFireball deals fire damage.\n"),
+    ]
+    grappling = split_passages(documents[0]["content"])[0]
+    conditions = split_passages(documents[1]["content"])[1]
+    budget = count_tokens(grappling) + count_tokens(conditions)
+    budget += count_tokens("Grappling") + count_tokens("Combat") + 2
+
+    context = build_context("grapple a creature speed", documents, budget=budget)
+
+    assert context == f"## Grappling\n{grappling}\n\n## Combat\n{conditions}"
+    assert conditions == "Conditions\nA grappled creature's speed is 0."
@@ -0,0 +1,54 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.models import embedding_cache
+from src.ingestion.embedding import embed_documents, encode_length_sorted
+
+
+class StubEncoder:
+    # Encodes each text as [number of words, position in TEXTS] and records
+    # the batches it was given; without a tokenizer lengths are word counts
+    max_seq_length = 512
+
+    def __init__(self):
+        self.batches = []
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.batches.append(list(texts))
+        return np.array(
+            [[len(text.split()), TEXTS.index(text)] for text in texts],
+            dtype=np.float32,
+        )
+
+
+TEXTS = [
+    "Roll initiative.",
+    "A grappled creature's speed becomes 0, and it can't benefit from bonuses.",
+    "Fireball.",
+    "Each turn you can move a distance up to your speed.",
+    "Opportunity attacks use your reaction.",
+]
+
+
+def test_length_sorted_batches_return_vectors_in_input_order():
+    model = StubEncoder()
+    vectors = encode_length_sorted(model, TEXTS, batch_size=2)
+
+    # Batches are formed longest first ...
+    assert [len(batch) for batch in model.batches] == [2, 2, 1]
+    assert model.batches[0][0] == TEXTS[1] and model.batches[-1] == ["Fireball."]
+    # ... but every vector lands back at its text's position
+    assert [int(vector[1]) for vector in vectors] == list(range(len(TEXTS)))
+
+
+def test_embedded_documents_keep_their_own_vectors(monkeypatch):
+    monkeypatch.setattr(embedding_cache, "EMBEDDING_CACHE_ENABLED", False)
+    documents = [{"content": text} for text in TEXTS]
+    embed_documents(StubEncoder(), documents, batch_size=2)
+
+    for position, doc in enumerate(documents):
+        assert doc["content_vector"] == [len(doc["content"].split()), position]
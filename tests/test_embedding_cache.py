@@ -0,0 +1,39 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.models.embedding_cache import EmbeddingCache, text_key
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    cache = EmbeddingCache("test-model", directory=str(tmp_path))
+    keys = [text_key("Fireball"), text_key("Magic Missile")]
+    cache.put_many(keys, np.array([[1.0, 0.0], [0.0, 1.0]]))
+
+    reopened = EmbeddingCache("test-model", directory=str(tmp_path))
+    vectors = reopened.get_many(keys + [text_key("Shield")])
+
+    assert vectors[0].tolist() == [1.0, 0.0]
+    assert vectors[1].tolist() == [0.0, 1.0]
+    assert vectors[2] is None
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 2
+    assert stats["misses"] == 1
+
+
+def test_keys_ignore_whitespace_differences():
+    assert text_key("Armor  Class\n") == text_key("Armor Class")
+    assert text_key("Armor Class") != text_key("armor class bonus")
+
+
+def test_memory_front_is_bounded(tmp_path):
+    cache = EmbeddingCache("test-model", directory=str(tmp_path), memory_items=2)
+    keys = [text_key(str(i)) for i in range(3)]
+    cache.put_many(keys, np.eye(3))
+
+    assert len(cache.memory) == 2
+    # The evicted entry is still served from the memory-mapped file
+    assert cache.get_many(keys[:1])[0].tolist() == [1.0, 0.0, 0.0]
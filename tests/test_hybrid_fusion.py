@@ -0,0 +1,46 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestion import elasticsearch_ingestion
+from src.ingestion.elasticsearch_ingestion import reciprocal_rank_fusion
+
+
+def hits(*ids):
+    return [
+        {"_id": doc_id, "_score": 10.0, "_source": {"title": doc_id}} for doc_id in ids
+    ]
+
+
+def test_documents_found_by_both_lists_rank_first():
+    fused = reciprocal_rank_fusion([hits("a", "b", "c"), hits("c", "d")], k=60)
+
+    assert [hit["_id"] for hit in fused][:2] == ["c", "a"]
+    assert len(fused) == 4
+    assert fused[0]["_score"] == 1 / 63 + 1 / 61
+
+
+def test_weights_shift_the_ranking():
+    lexical, vector = hits("a", "b"), hits("b", "a")
+
+    assert reciprocal_rank_fusion([lexical, vector], [2.0, 1.0])[0]["_id"] == "a"
+    assert reciprocal_rank_fusion([lexical, vector], [1.0, 2.0])[0]["_id"] == "b"
+
+
+def test_bm25_search_keeps_the_content_only_query(monkeypatch):
+    bodies = []
+
+    class FakeEs:
+        def search(self, index, body):
+            bodies.append(body)
+            return {"hits": {"hits": []}}
+
+    monkeypatch.setattr(elasticsearch_ingestion, "get_es", FakeEs)
+    elasticsearch_ingestion.bm25_search("grapple", top_k=3)
+
+    assert bodies[0]["query"] == {
+        "match": {"content": {"query": "grapple", "fuzziness": "AUTO"}}
+    }
+    assert bodies[0]["size"] == 3
@@ -0,0 +1,57 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestion import indexing
+from src.ingestion.manifest import new_manifest, save_manifest, scan_directory
+
+
+class StopWatching(Exception):
+    pass
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_watch_waits_for_failed_files_to_change(tmp_path, monkeypatch):
+    data_dir = str(tmp_path / "dnd_srd")
+    manifest_path = str(tmp_path / "manifest.json")
+    write(os.path.join(data_dir, "Bard.md"), "# Bard")
+    write(os.path.join(data_dir, "Broken.md"), "# Broken")
+    runs = []
+
+    def fake_incremental_index(directory, manifest_path, *args):
+        # Records every file except Broken.md, like a run where it failed
+        runs.append(1)
+        manifest = new_manifest("dnd_5e_srd")
+        entries = scan_directory(directory)
+        manifest["files"] = {
+            key: entry for key, entry in entries.items() if key != "Broken.md"
+        }
+        save_manifest(manifest, manifest_path)
+
+    polls = []
+
+    def fake_sleep(interval):
+        polls.append(interval)
+        if len(polls) == 3:
+            write(os.path.join(data_dir, "Broken.md"), "# Broken\n\nFixed")
+        if len(polls) == 5:
+            raise StopWatching()
+
+    monkeypatch.setattr(indexing, "incremental_index", fake_incremental_index)
+    monkeypatch.setattr(indexing.time, "sleep", fake_sleep)
+    try:
+        indexing.watch_index(data_dir, manifest_path, interval=2.0)
+        raise AssertionError("watch_index should only stop through sleep")
+    except StopWatching:
+        pass
+
+    # The first run, then one more after Broken.md was edited, instead of one
+    # per poll
+    assert len(runs) == 2
@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestion.manifest import (
+    new_manifest,
+    load_manifest,
+    save_manifest,
+    is_compatible,
+    scan_directory,
+    plan_changes,
+)
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def test_plan_changes(tmp_path):
+    data_dir = str(tmp_path / "dnd_srd")
+    write(os.path.join(data_dir, "Classes", "Bard.md"), "# Bard")
+    write(os.path.join(data_dir, "Classes", "Monk.md"), "# Monk")
+    write(os.path.join(data_dir, "Races", "Elf.md"), "# Elf")
+    write(os.path.join(data_dir, "notes.txt"), "not markdown")
+
+    manifest = new_manifest("dnd_5e_srd")
+    manifest["files"] = scan_directory(data_dir)
+    assert sorted(manifest["files"]) == [
+        os.path.join("Classes", "Bard.md"),
+        os.path.join("Classes", "Monk.md"),
+        os.path.join("Races", "Elf.md"),
+    ]
+
+    write(os.path.join(data_dir, "Classes", "Bard.md"), "# Bard\n\nUpdated")
+    os.remove(os.path.join(data_dir, "Classes", "Monk.md"))
+    write(os.path.join(data_dir, "Races", "Dwarf.md"), "# Dwarf")
+
+    changes = plan_changes(scan_directory(data_dir, manifest), manifest)
+    assert changes["added"] == [os.path.join("Races", "Dwarf.md")]
+    assert changes["changed"] == [os.path.join("Classes", "Bard.md")]
+    assert changes["removed"] == [os.path.join("Classes", "Monk.md")]
+    assert changes["unchanged"] == 1
+
+
+def test_manifest_round_trip(tmp_path):
+    manifest_path = str(tmp_path / "manifest.json")
+    assert load_manifest(manifest_path) is None
+
+    manifest = new_manifest("dnd_5e_srd")
+    save_manifest(manifest, manifest_path)
+    loaded = load_manifest(manifest_path)
+
+    assert is_compatible(loaded, "dnd_5e_srd")
+    assert not is_compatible(loaded, "another_index")
+    assert loaded["updated_at"] is not None
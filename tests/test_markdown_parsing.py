@@ -0,0 +1,34 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.ingestion.markdown_parsing import parse_documents
+
+
+def test_parse_documents_keeps_order_and_reports_failures(tmp_path):
+    file_paths = []
+    for name in ["Bard", "Broken", "Cleric", "Druid"]:
+        path = tmp_path / "Classes" / f"{name}.md"
+        path.parent.mkdir(exist_ok=True)
+        if name == "Broken":
+            # Not valid UTF-8, so reading the file fails
+            path.write_bytes(b"# Broken\n\n\xff\xfe")
+        else:
+            path.write_text(f"# {name}\n\nThe {name.lower()} class.", encoding="utf-8")
+        file_paths.append(str(path))
+
+    for workers in [1, 2]:
+        results = list(parse_documents(file_paths, workers=workers))
+
+        assert [file_path for file_path, _, _ in results] == file_paths
+        failures = [(file_path, error) for file_path, _, error in results if error]
+        assert len(failures) == 1 and failures[0][0] == file_paths[1]
+        assert failures[0][1].startswith("UnicodeDecodeError")
+        assert results[1][1] is None
+        assert [documents[0]["title"] for _, documents, _ in results if documents] == [
+            "Bard",
+            "Cleric",
+            "Druid",
+        ]
@@ -0,0 +1,215 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import asyncio
+import httpx
+from src.models import ollama_interface
+
+
+def test_generations_share_one_pooled_client(monkeypatch):
+    prompts = []
+
+    def handler(request):
+        prompts.append(json.loads(request.content)["prompt"])
+        return httpx.Response(200, json={"response": "Roll initiative."})
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+    monkeypatch.setattr(ollama_interface, "_client", None)
+
+    async def ask_twice():
+        first = await ollama_interface.rag_query_async("How?", "Combat rules")
+        client = ollama_interface.get_async_client()
+        second = await ollama_interface.rag_query_async("Why?", "Combat rules")
+        assert ollama_interface.get_async_client() is client
+        await ollama_interface.close_async_client()
+        return first, second
+
+    assert asyncio.run(ask_twice()) == ("Roll initiative.", "Roll initiative.")
+    assert ollama_interface.rag_query("When?", "Combat rules") == "Roll initiative."
+    assert len(prompts) == 3 and "Question: How?" in prompts[0]
+
+
+def test_errors_return_the_fallback_answer(monkeypatch):
+    transport = httpx.MockTransport(lambda request: httpx.Response(500))
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+    monkeypatch.setattr(ollama_interface, "_client", None)
+
+    answer = asyncio.run(ollama_interface.rag_query_async("How?", "Combat rules"))
+    assert answer == ollama_interface.ERROR_ANSWER
+
+
+def test_generation_stats_come_from_the_response(monkeypatch):
+    body = {
+        "response": "Roll initiative.",
+        "prompt_eval_count": 120,
+        "eval_count": 40,
+        "load_duration": 500_000_000,
+        "prompt_eval_duration": 250_000_000,
+        "eval_duration": 2_000_000_000,
+        "total_duration": 2_800_000_000,
+    }
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=body))
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+    monkeypatch.setattr(ollama_interface, "_client", None)
+
+    answer, stats = ollama_interface.rag_generate("How?", "Combat rules")
+    assert answer == "Roll initiative."
+    assert stats["prompt_tokens"] == 120 and stats["answer_tokens"] == 40
+    assert stats["total_tokens"] == 160
+    assert stats["load_duration"] == 0.5 and stats["total_duration"] == 2.8
+    assert stats["tokens_per_second"] == 20.0
+
+    # A prompt served from Ollama's cache reports no prompt_eval_count
+    assert ollama_interface.generation_stats({"eval_count": 3})["total_tokens"] == 3
+    assert ollama_interface.generation_stats({})["tokens_per_second"] == 0.0
+
+
+def test_stream_yields_chunks_as_they_arrive(monkeypatch):
+    lines = [
+        {"response": "Roll", "done": False},
+        {"response": " initiative.", "done": False},
+        {"response": "", "done": True, "eval_count": 2},
+    ]
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        body = "\n".join(json.dumps(line) for line in lines) + "\n"
+        return httpx.Response(200, content=body.encode("utf-8"))
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+
+    async def collect():
+        stream = ollama_interface.rag_query_stream("How?", "Combat rules")
+        chunks = [chunk async for chunk in stream]
+        await ollama_interface.close_async_client()
+        return chunks
+
+    assert asyncio.run(collect()) == lines
+
+
+def test_scheduler_serves_interactive_before_batch_and_rejects_overflow():
+    scheduler = ollama_interface.GenerationScheduler(
+        max_concurrency=1, max_depth=2, max_wait=5
+    )
+    order = []
+
+    async def generate(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await scheduler.acquire()
+        waiting = [
+            asyncio.ensure_future(generate("evaluation", "batch")),
+            asyncio.ensure_future(generate("chat", "interactive")),
+        ]
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued_by_priority"] == {
+            "interactive": 1,
+            "batch": 1,
+        }
+        try:
+            await generate("overflow", "interactive")
+            raise AssertionError("a full queue should reject new requests")
+        except ollama_interface.SchedulerBusy as e:
+            assert e.retry_after >= 1
+        scheduler.release()
+        await asyncio.gather(*waiting)
+
+    asyncio.run(main())
+    assert order == ["chat", "evaluation"]
+    stats = scheduler.stats()
+    assert (stats["active"], stats["queued"], stats["rejected"]) == (0, 0, 1)
+
+
+def test_scheduler_gives_up_after_max_wait():
+    scheduler = ollama_interface.GenerationScheduler(
+        max_concurrency=1, max_depth=4, max_wait=0.01
+    )
+
+    async def main():
+        await scheduler.acquire()
+        try:
+            await scheduler.acquire("batch")
+        except ollama_interface.SchedulerBusy:
+            return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["timed_out"], stats["queued"], stats["active"]) == (1, 0, 1)
+
+
+def test_scheduler_timeout_returns_a_slot_handed_over_at_the_deadline(monkeypatch):
+    scheduler = ollama_interface.GenerationScheduler(
+        max_concurrency=1, max_depth=4, max_wait=0.01
+    )
+
+    async def wait_for(future, timeout):
+        # The holder releases its slot to this waiter just as the wait times out
+        scheduler.release()
+        raise asyncio.TimeoutError()
+
+    async def main():
+        await scheduler.acquire()
+        monkeypatch.setattr(asyncio, "wait_for", wait_for)
+        try:
+            await scheduler.acquire()
+            raise AssertionError("acquire should have timed out")
+        except ollama_interface.SchedulerBusy:
+            pass
+        monkeypatch.undo()
+        return scheduler.stats()
+
+    stats = asyncio.run(main())
+    assert (stats["timed_out"], stats["queued"], stats["active"]) == (1, 0, 0)
+
+
+def test_stream_raises_on_error_chunks_and_missing_done(monkeypatch):
+    bodies = [
+        [{"response": "Roll", "done": False}, {"error": "model runner crashed"}],
+        [{"response": "Roll", "done": False}],
+    ]
+
+    def handler(request):
+        body = "\n".join(json.dumps(line) for line in bodies.pop(0)) + "\n"
+        return httpx.Response(200, content=body.encode("utf-8"))
+
+    transport = httpx.MockTransport(handler)
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+    monkeypatch.setattr(ollama_interface, "_client", None)
+
+    async def collect():
+        chunks = []
+        try:
+            async for chunk in ollama_interface.rag_query_stream("How?", "Rules"):
+                chunks.append(chunk)
+        except ollama_interface.GenerationError as e:
+            return chunks, str(e)
+        raise AssertionError("a failed stream should raise")
+
+    async def main():
+        results = [await collect(), await collect()]
+        await ollama_interface.close_async_client()
+        return results
+
+    (first, error), (second, missing) = asyncio.run(main())
+    assert first == second == [{"response": "Roll", "done": False}]
+    assert "model runner crashed" in error
+    assert "without a final chunk" in missing
+    assert ollama_interface.scheduler.stats()["active"] == 0
@@ -0,0 +1,99 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import asyncio
+import httpx
+from src.models import ollama_interface
+from src.pipeline import rag_pipeline
+from src.pipeline.answer_cache import SemanticAnswerCache
+
+DOCUMENTS = [
+    {
+        "_id": "grapple",
+        "_score": 1.8,
+        "title": "Grappling",
+        "content": "When you want to grab a creature, you can make a grapple.",
+        "file_path": "Gameplay/Combat.md",
+    }
+]
+
+
+def test_failed_generations_are_not_cached(monkeypatch):
+    transport = httpx.MockTransport(lambda request: httpx.Response(500))
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+    monkeypatch.setattr(ollama_interface, "_client", None)
+
+    async def retrieve_async(query, **kwargs):
+        return DOCUMENTS
+
+    cache = SemanticAnswerCache(max_items=10)
+    monkeypatch.setattr(rag_pipeline, "answer_cache", cache)
+    monkeypatch.setattr(rag_pipeline, "ANSWER_CACHE_ENABLED", True)
+    monkeypatch.setattr(rag_pipeline, "get_index_version", lambda: "v1")
+    monkeypatch.setattr(rag_pipeline, "embed_query", lambda query: [1.0, 0.0])
+    monkeypatch.setattr(
+        rag_pipeline, "retrieve_relevant_documents", lambda query, **kwargs: DOCUMENTS
+    )
+
+    async def get_index_version_async():
+        return "v1"
+
+    monkeypatch.setattr(
+        rag_pipeline, "get_index_version_async", get_index_version_async
+    )
+    monkeypatch.setattr(
+        rag_pipeline, "retrieve_relevant_documents_async", retrieve_async
+    )
+
+    async def ask():
+        result = await rag_pipeline.run_rag_pipeline_async("How do I grapple?")
+        await ollama_interface.close_async_client()
+        return result
+
+    for result in [
+        rag_pipeline.run_rag_pipeline("How do I grapple?"),
+        asyncio.run(ask()),
+    ]:
+        assert result["answer"] == ollama_interface.ERROR_ANSWER
+        assert "error" in result
+        assert result["file_references"] == ["Gameplay/Combat.md"]
+    assert len(cache) == 0
+
+
+def test_interrupted_streams_are_not_cached(monkeypatch):
+    # The model stops before Ollama's final "done" chunk
+    body = json.dumps({"response": "You can", "done": False}) + "\n"
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, content=body.encode("utf-8"))
+    )
+    monkeypatch.setattr(
+        ollama_interface, "client_options", lambda: {"transport": transport}
+    )
+    monkeypatch.setattr(ollama_interface, "_client", None)
+
+    async def semantic_cache_miss(query):
+        return None, [1.0, 0.0], "v1"
+
+    async def retrieve_context(query):
+        return DOCUMENTS, DOCUMENTS[0]["content"]
+
+    cache = SemanticAnswerCache(max_items=10)
+    monkeypatch.setattr(rag_pipeline, "answer_cache", cache)
+    monkeypatch.setattr(rag_pipeline, "semantic_cache_hit_async", semantic_cache_miss)
+    monkeypatch.setattr(rag_pipeline, "retrieve_context_async", retrieve_context)
+
+    async def ask():
+        events = [
+            event async for event, _ in rag_pipeline.stream_rag_pipeline("Grapple?")
+        ]
+        await ollama_interface.close_async_client()
+        return events
+
+    assert asyncio.run(ask()) == ["metadata", "token", "error"]
+    assert len(cache) == 0
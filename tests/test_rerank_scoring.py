@@ -0,0 +1,44 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from src.ingestion import reranking
+
+
+class NoEncodeModel:
+    # Documents must be scored from their stored vectors, never encoded
+    def encode(self, texts, **kwargs):
+        raise AssertionError(f"Unexpected encode of {texts}")
+
+
+def test_rerank_uses_stored_vectors_and_terms(monkeypatch):
+    monkeypatch.setattr(reranking, "get_sentence_transformer", NoEncodeModel)
+    monkeypatch.setattr(reranking, "embed_query", lambda query: np.array([1.0, 0.0]))
+    documents = [
+        {
+            "title": "Spells",
+            "content": "Fireball deals fire damage.",
+            "content_vector": [0.0, 1.0],
+            "content_terms": ["damage", "deals", "fire", "fireball"],
+            "_score": 1.0,
+        },
+        {
+            "title": "Grappling",
+            "content": "The grapple rules use Athletics.",
+            "content_vector": [1.0, 0.0],
+            "content_terms": ["athletics", "grapple", "rules", "the", "use"],
+            "_score": 1.0,
+        },
+    ]
+
+    reranked = reranking.rerank_documents("grapple rules", documents, top_k=1)
+
+    assert [doc["title"] for doc in reranked] == ["Grappling"]
+
+
+def test_count_matching_terms():
+    assert reranking.count_matching_terms(["a", "c", "z"], ["a", "b", "c"]) == 2
+    assert reranking.count_matching_terms(["a"], []) == 0
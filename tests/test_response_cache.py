@@ -0,0 +1,61 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.models.ollama_interface import ERROR_ANSWER
+from src.pipeline.response_cache import ResponseCache, canonical_query, cache_response
+
+
+def test_canonical_query_expands_abbreviations_and_folds_case():
+    assert canonical_query("What  is my AC\n") == "what is my armor class"
+    assert canonical_query("what is my armor class") == "what is my armor class"
+
+
+def test_canonical_query_ignores_punctuation():
+    assert canonical_query("What is AC?") == "what is armor class"
+    assert canonical_query("what is  armor class?") == "what is armor class"
+    assert (
+        canonical_query("HP, AC and XP!")
+        == "hit points armor class and experience points"
+    )
+
+
+def test_disk_tier_survives_restart_until_index_changes(tmp_path):
+    response = {"answer": "Roll a d20", "file_references": ["combat.md"]}
+    cache = ResponseCache(max_items=10, ttl=60, directory=str(tmp_path))
+    assert cache.get("How do I grapple?", "v1")[0] is None
+    cache.put("How do I grapple?", response, "v1")
+    assert cache.get("how do i  GRAPPLE?", "v1")[2] == "memory"
+
+    restarted = ResponseCache(max_items=10, ttl=60, directory=str(tmp_path))
+    cached, age, tier = restarted.get("How do I grapple?", "v1")
+    assert cached == response and tier == "disk" and age >= 0
+
+    assert restarted.get("How do I grapple?", "v2")[0] is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_failed_generations_are_not_cached(tmp_path):
+    cache = ResponseCache(max_items=10, ttl=60, directory=str(tmp_path))
+    cache.check_version("v1")
+    # What the pipeline returns when Ollama fails: the apology, marked
+    failed = {
+        "question": "How do I grapple?",
+        "answer": ERROR_ANSWER,
+        "retrieval_metrics": {"num_retrieved": 1},
+        "file_references": ["Gameplay/Combat.md"],
+        "error": "Server error '500 Internal Server Error'",
+    }
+    response = cache_response("How do I grapple?", failed, "v1", cache)
+    assert response["answer"] == ERROR_ANSWER
+    # The error is passed on to be recorded with the interaction
+    assert response["error"] == failed["error"]
+    assert cache.get("How do I grapple?", "v1")[0] is None
+    assert os.listdir(tmp_path) == []
+
+    answered = {**failed, "answer": "Make a grapple check."}
+    del answered["error"]
+    cache_response("How do I grapple?", answered, "v1", cache)
+    assert cache.get("How do I grapple?", "v1")[0]["answer"] == "Make a grapple check."
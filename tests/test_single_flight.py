@@ -0,0 +1,70 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+from src.utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_computation():
+    flights = SingleFlight()
+    calls = []
+
+    async def answer(question):
+        calls.append(question)
+        await asyncio.sleep(0.01)
+        return f"answer to {question}"
+
+    async def main():
+        requests = [flights.run("grapple", lambda: answer("grapple")) for _ in range(3)]
+        requests.append(flights.run("shove", lambda: answer("shove")))
+        pending = asyncio.gather(*requests)
+        await asyncio.sleep(0)
+        waiters = {entry["key"]: entry["waiters"] for entry in flights.stats()["keys"]}
+        return await pending, waiters
+
+    results, waiters = asyncio.run(main())
+
+    assert calls == ["grapple", "shove"]
+    assert waiters == {"grapple": 2, "shove": 0}
+    assert [shared for _, shared in results] == [False, True, True, False]
+    assert results[2][0] == "answer to grapple"
+    stats = flights.stats()
+    assert (stats["in_flight"], stats["coalesced"], stats["max_waiters"]) == (0, 2, 2)
+
+
+def test_cancelled_caller_does_not_cancel_the_others():
+    flights = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(flights.run("grapple", answer))
+        second = asyncio.ensure_future(flights.run("grapple", answer))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_start_hands_out_the_running_task():
+    flights = SingleFlight()
+
+    async def answer():
+        await asyncio.sleep(0.01)
+        return "done"
+
+    async def main():
+        task, shared = flights.start("grapple", answer)
+        again, shared_again = flights.start("grapple", answer)
+        assert again is task and (shared, shared_again) == (False, True)
+        result = await flights.run("grapple", answer)
+        return await task, result
+
+    assert asyncio.run(main()) == ("done", ("done", True))
+    assert flights.stats()["computations"] == 1
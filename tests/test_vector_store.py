@@ -0,0 +1,90 @@
+import sys
+import os
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asyncio
+import numpy as np
+from src.ingestion import elasticsearch_ingestion
+from src.ingestion.vector_store import VectorStore, write_vector_store
+
+
+def build_store(directory):
+    documents = [
+        ("a", {"title": "Fireball", "type": "spells", "content_vector": [1.0, 0.0]}),
+        ("b", {"title": "Shield", "type": "spells", "content_vector": [0.6, 0.8]}),
+        ("c", {"title": "Plate", "type": "equipment", "content_vector": [0.9, 0.1]}),
+    ]
+    write_vector_store(documents, str(directory))
+    return VectorStore(str(directory))
+
+
+def test_search_ranks_by_cosine_and_filters(tmp_path):
+    store = build_store(tmp_path)
+
+    assert [row for row, _ in store.search([2.0, 0.0], top_k=2)] == [0, 2]
+    filtered = store.search([2.0, 0.0], top_k=3, filters={"type": "spells"})
+    assert [store.ids[row] for row, _ in filtered] == ["a", "b"]
+    assert abs(filtered[1][1] - 0.6) < 1e-6
+
+
+def test_retrieval_runs_without_elasticsearch(tmp_path, monkeypatch):
+    store = build_store(tmp_path)
+    monkeypatch.setattr(elasticsearch_ingestion, "get_vector_store", lambda: store)
+    monkeypatch.setattr(elasticsearch_ingestion, "encode_query", lambda q: [0.0, 1.0])
+
+    documents = elasticsearch_ingestion.retrieve_relevant_documents(
+        "shield spell",
+        top_k=1,
+        rerank=False,
+        rewrite_query=False,
+        backend="local",
+        fields=["title"],
+    )
+
+    assert [(doc["_id"], doc["title"]) for doc in documents] == [("b", "Shield")]
+    assert abs(documents[0]["_score"] - 1.8) < 1e-6
+
+
+def test_quantized_search_rescores_to_exact_results(tmp_path):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 32))
+    documents = [
+        (str(i), {"content_vector": v.tolist()}) for i, v in enumerate(vectors)
+    ]
+    queries = rng.standard_normal((20, 32))
+
+    for quantization, rescore_factor, min_recall in [
+        ("int8", 4, 1.0),
+        ("binary", 20, 0.8),
+    ]:
+        directory = tmp_path / quantization
+        write_vector_store(documents, str(directory), quantization=quantization)
+        store = VectorStore(str(directory))
+        assert store.codes.nbytes < store.vectors.nbytes
+
+        recalls = []
+        for query in queries:
+            exact = store.search(query, top_k=5, quantization="none")
+            approx = store.search(query, top_k=5, rescore_factor=rescore_factor)
+            # Shortlisted rows are rescored with their exact similarity
+            scores = store.scores(query)
+            assert all(abs(score - scores[row]) < 1e-5 for row, score in approx)
+            rows = {row for row, _ in exact} & {row for row, _ in approx}
+            recalls.append(len(rows) / 5)
+        assert sum(recalls) / len(recalls) >= min_recall
+
+
+def test_async_retrieval_matches_blocking_retrieval(tmp_path, monkeypatch):
+    store = build_store(tmp_path)
+    monkeypatch.setattr(elasticsearch_ingestion, "get_vector_store", lambda: store)
+    monkeypatch.setattr(elasticsearch_ingestion, "encode_query", lambda q: [1.0, 0.0])
+    options = {"top_k": 2, "rerank": False, "rewrite_query": False, "backend": "local"}
+
+    documents = asyncio.run(
+        elasticsearch_ingestion.retrieve_relevant_documents_async("fire", **options)
+    )
+
+    expected = elasticsearch_ingestion.retrieve_relevant_documents("fire", **options)
+    assert [doc["_id"] for doc in documents] == [doc["_id"] for doc in expected]